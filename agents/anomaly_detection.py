@@ -5,6 +5,10 @@ import numpy as np
 from sklearn.ensemble import IsolationForest
 from db.sqlite_db import AMLDatabase
 from sklearn.preprocessing import LabelEncoder
+from utils import rollups
+
+CHUNK_SIZE = 500_000
+SAMPLE_SIZE = 200_000
 
 class AnomalyDetectionAgent:
     def __init__(self):
@@ -13,11 +17,18 @@ class AnomalyDetectionAgent:
         self.model = IsolationForest(contamination=0.01, random_state=42)  # 1% anomalies
         self.label_encoder = LabelEncoder()
 
-    def prepare_features(self, df):
-        """Prepare features for anomaly detection."""
+    def prepare_features(self, df, fit=True):
+        """Prepare features for anomaly detection.
+
+        With `fit=False` the already fitted type encoding is reused, so chunks
+        scored separately share one encoding.
+        """
         print("🔧 Preparing features...")
         features = df[['step', 'amount']].copy()
-        features['type_encoded'] = self.label_encoder.fit_transform(df['type'])
+        if fit:
+            features['type_encoded'] = self.label_encoder.fit_transform(df['type'])
+        else:
+            features['type_encoded'] = self.label_encoder.transform(df['type'])
         return features
 
     def detect_anomalies(self, df):
@@ -30,8 +41,8 @@ class AnomalyDetectionAgent:
         df['is_anomaly'] = (predictions == -1).astype(int)
         return df
 
-    def analyze(self, df):
-        """Analyze transactions and flag anomalies."""
+    def analyze(self, df, save_scores=True):
+        """Analyze transactions, flag anomalies and (by default) save the scores and their rollups."""
         print(f"📊 Analyzing {len(df)} transactions for anomalies...")
         df = self.detect_anomalies(df)
 
@@ -44,9 +55,73 @@ class AnomalyDetectionAgent:
                 flag_reason=f"Anomaly detected (score: {row['anomaly_score']:.2f})"
             )
 
+        if save_scores:
+            self.db.save_anomaly_scores(df)
+
         print(f"✅ Flagged {len(anomalies)} anomalies.")
         return df
 
+    def sample_transactions(self, chunks, sample_size=SAMPLE_SIZE, random_state=42):
+        """Draw a uniform sample from a stream of chunks (bottom-k on random keys).
+
+        Also returns every transaction type seen, so the encoder covers types
+        that may be missing from the sample.
+        """
+        rng = np.random.default_rng(random_state)
+        sample = None
+        types = set()
+        for chunk in chunks:
+            types.update(chunk['type'].unique())
+            chunk = chunk.assign(_key=rng.random(len(chunk)))
+            sample = chunk if sample is None else pd.concat([sample, chunk], ignore_index=True)
+            sample = sample.nsmallest(sample_size, '_key')
+        if sample is None:
+            return pd.DataFrame(), sorted(types)
+        return sample.drop(columns='_key').reset_index(drop=True), sorted(types)
+
+    def analyze_out_of_core(self, chunksize=CHUNK_SIZE, sample_size=SAMPLE_SIZE):
+        """Detect anomalies over the transactions table without loading it whole.
+
+        The forest is fitted on a bounded uniform sample; every chunk is then
+        scored against it and anomalies are flagged in bulk. Only anomalous
+        rows are kept in the anomaly_scores table; the score rollups cover
+        every transaction.
+        """
+        columns = ['id', 'step', 'type', 'amount']
+        print(f"📊 Sampling up to {sample_size} transactions for model fitting...")
+        sample, types = self.sample_transactions(self.db.iter_transactions(chunksize, columns), sample_size)
+        if sample.empty:
+            print("⚠️ No transactions to analyze.")
+            return pd.DataFrame(columns=['id', 'anomaly_score'])
+
+        self.label_encoder.fit(types)
+        self.model.fit(self.prepare_features(sample, fit=False))
+
+        print("🕵️‍♂️ Scoring transactions chunk by chunk...")
+        anomalies = []
+        total = 0
+        summaries = None
+        for chunk in self.db.iter_transactions(chunksize, columns):
+            features = self.prepare_features(chunk, fit=False)
+            scores = self.model.score_samples(features)
+            # Same rule as predict(): below the contamination-based offset
+            mask = scores < self.model.offset_
+            anomalies.append(pd.DataFrame({'id': chunk['id'].to_numpy()[mask], 'anomaly_score': scores[mask]}))
+            total += len(chunk)
+
+            # Dashboard rollups are additive, so they are accumulated per chunk
+            partial = rollups.score_histogram(scores, mask) + rollups.anomaly_density(chunk['amount'], scores, mask)
+            summaries = partial if summaries is None else tuple(a + b for a, b in zip(summaries, partial))
+
+        anomalies = pd.concat(anomalies, ignore_index=True)
+        self.db.save_anomaly_scores(anomalies.assign(is_anomaly=1), summaries=summaries)
+        self.db.flag_cases(
+            (tid, "AnomalyDetection", f"Anomaly detected (score: {score:.2f})")
+            for tid, score in zip(anomalies['id'], anomalies['anomaly_score'])
+        )
+        print(f"✅ Flagged {len(anomalies)} anomalies out of {total} transactions.")
+        return anomalies
+
 # Run standalone
 if __name__ == "__main__":
     from utils.data_loader import load_paysim_data
@@ -0,0 +1,90 @@
+# aml_investigation_platform/agents/evidence.py
+
+import pandas as pd
+from db.sqlite_db import AMLDatabase
+
+
+class EvidenceAssembler:
+    """Gather SAR evidence for a batch of flagged cases from the transaction history.
+
+    Context is fetched with a handful of set-based queries per batch rather
+    than per case, and cached per account (and per flagged transaction) so
+    repeated investigations only query what they have not seen yet.
+    """
+
+    def __init__(self, db=None):
+        self.db = db or AMLDatabase()
+        self.account_cache = {}
+        self.prior_cache = {}
+
+    def clear_cache(self):
+        """Forget cached context (e.g. after new transactions were ingested)."""
+        self.account_cache.clear()
+        self.prior_cache.clear()
+
+    def _fetch_accounts(self, account_ids):
+        """Load context for accounts that are not cached yet."""
+        missing = [a for a in set(account_ids) if a not in self.account_cache]
+        if not missing:
+            return
+        print(f"🔎 Fetching history for {len(missing)} accounts...")
+        context = self.db.get_account_context(missing)
+        sent = context['sent'].set_index('account_id').to_dict('index')
+        received = context['received'].set_index('account_id').to_dict('index')
+        flags = context['flags'].set_index('account_id')['n_flagged'].to_dict()
+        counterparties = {
+            account: list(zip(group['counterparty'], group['n'], group['amount']))
+            for account, group in context['counterparties'].groupby('account_id')
+        }
+        for account in missing:
+            self.account_cache[account] = {
+                **sent.get(account, {'n_sent': 0, 'amount_sent': 0.0, 'n_recipients': 0, 'n_drains': 0}),
+                **received.get(account, {'n_received': 0, 'amount_received': 0.0, 'n_senders': 0}),
+                'n_flagged': flags.get(account, 0),
+                'counterparties': counterparties.get(account, []),
+            }
+
+    def _fetch_prior(self, cases):
+        """Load prior-activity rows for flagged transactions that are not cached yet."""
+        missing = [case for case in cases if case[0] not in self.prior_cache]
+        if not missing:
+            return
+        prior = self.db.get_prior_activity(missing)
+        self.prior_cache.update(prior.set_index('transaction_id').to_dict('index'))
+
+    def assemble(self, flagged_df):
+        """Return {transaction_id: evidence text} for every case with a known sender."""
+        if flagged_df.empty or 'origId' not in flagged_df.columns:
+            return {}
+        cases_df = flagged_df.dropna(subset=['origId'])
+        cases = list(zip(cases_df['transaction_id'].astype(int), cases_df['origId'].astype(int),
+                         cases_df['step'].astype(int)))
+        self._fetch_accounts(account for _, account, _ in cases)
+        self._fetch_prior(cases)
+
+        evidence = {}
+        for transaction_id, account, step in cases:
+            evidence[transaction_id] = self.format_evidence(
+                self.account_cache[account], self.prior_cache.get(transaction_id, {}), step
+            )
+        return evidence
+
+    @staticmethod
+    def format_evidence(account, prior, step):
+        """Render account and prior-activity context as SAR evidence text."""
+        parts = [
+            f"{prior.get('n_prior', 0)} prior transfers (${prior.get('amount_prior', 0):,.2f}) "
+            f"by the sender up to step {step}",
+            f"{account['n_sent']} transfers sent in total (${account['amount_sent']:,.2f}) "
+            f"to {account['n_recipients']} counterparties",
+            f"{account['n_received']} transfers received (${account['amount_received']:,.2f}) "
+            f"from {account['n_senders']} senders",
+        ]
+        if not pd.isna(account['n_drains']):
+            parts.append(f"{int(account['n_drains'])} balance drains to zero")
+        # The case's own transaction is among the flagged ones
+        parts.append(f"{max(account['n_flagged'] - 1, 0)} other flagged transactions from this account")
+        if account['counterparties']:
+            top = ", ".join(f"{name} ({n} txns, ${amount:,.2f})" for name, n, amount in account['counterparties'])
+            parts.append(f"Top counterparties: {top}")
+        return ". ".join(parts) + "."
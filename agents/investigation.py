@@ -1,8 +1,8 @@
 import os
 import pandas as pd
 import datetime
-import random
 from db.sqlite_db import AMLDatabase
+from agents.evidence import EvidenceAssembler
 
 # Read USE_LLM flag from environment—default to False for now
 USE_LLM = os.getenv("USE_LLM", "False").lower() in ("true", "1", "yes")
@@ -24,32 +24,32 @@ class InvestigationAgent:
     def __init__(self):
         """Initialize database and optional LLM pipeline."""
         self.db = AMLDatabase()
+        self.evidence_assembler = EvidenceAssembler(self.db)
         self.use_llm = LLM_AVAILABLE
 
         if self.use_llm:
             model_path = os.path.join("models", "mistral-7b.Q4_0.gguf")
             self.llm = GPT4All(model=model_path, backend="llama")
             self.prompt_template = PromptTemplate(
-                input_variables=["transaction_id", "agent_type", "flag_reason", "mock_evidence", "date"],
+                input_variables=["transaction_id", "agent_type", "flag_reason", "evidence", "date"],
                 template=(
                     "Generate a Suspicious Activity Report (SAR) for transaction ID {transaction_id}, "
                     "flagged by {agent_type} due to: {flag_reason}. "
-                    "Include the following evidence: {mock_evidence}. "
+                    "Include the following evidence: {evidence}. "
                     "Report generated on {date}."
                 )
             )
             # New chaining syntax
             self.chain = self.prompt_template | self.llm
 
-    def generate_mock_evidence(self, transaction):
-        """Generate simple mock evidence for a transaction."""
-        mock_ips = [f"192.168.{random.randint(0,255)}.{random.randint(0,255)}" for _ in range(3)]
-        count = random.randint(5,15)
-        return f"IP Logs: {', '.join(mock_ips)}. Previous {count} similar transfers."
+    def generate_report(self, transaction_id, agent_type, flag_reason, transaction_data, evidence=None):
+        """Return either an LLM-generated or fallback SAR.
 
-    def generate_report(self, transaction_id, agent_type, flag_reason, transaction_data):
-        """Return either an LLM-generated or fallback SAR."""
-        mock_evidence = self.generate_mock_evidence(transaction_data)
+        `evidence` comes from the EvidenceAssembler; when the case has no
+        transaction history the report says so instead of inventing any.
+        """
+        if evidence is None:
+            evidence = "No transaction history available for this case."
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
         if self.use_llm:
@@ -57,7 +57,7 @@ class InvestigationAgent:
                 "transaction_id": transaction_id,
                 "agent_type": agent_type,
                 "flag_reason": flag_reason,
-                "mock_evidence": mock_evidence,
+                "evidence": evidence,
                 "date": timestamp
             })
         # Fallback template
@@ -66,7 +66,7 @@ class InvestigationAgent:
             f"Transaction ID: {transaction_id}\n"
             f"Flagged By: {agent_type}\n"
             f"Reason: {flag_reason}\n"
-            f"Evidence: {mock_evidence}\n"
+            f"Evidence: {evidence}\n"
             f"Generated On: {timestamp}\n"
         )
 
@@ -82,6 +82,9 @@ class InvestigationAgent:
         flagged_df = flagged_df.reset_index(drop=True)  # Ensure clean index
         flagged_df = flagged_df.iloc[:min(max_cases, len(flagged_df))]  # Limit to max_cases
 
+        # Gather evidence for the whole batch up front
+        evidence = self.evidence_assembler.assemble(flagged_df)
+
         reports = {}
         for _, row in flagged_df.iterrows():
             tid = row["transaction_id"]
@@ -89,7 +92,8 @@ class InvestigationAgent:
                 transaction_id=tid,
                 agent_type=row["agent_type"],
                 flag_reason=row["flag_reason"],
-                transaction_data=row
+                transaction_data=row,
+                evidence=evidence.get(int(tid))
             )
             reports[tid] = report
             print(f"✅ Generated SAR for Transaction ID {tid}")
@@ -1,68 +1,201 @@
 # aml_investigation_platform/agents/transaction_analysis.py
 
+import numpy as np
 import pandas as pd
-import networkx as nx
 from db.sqlite_db import AMLDatabase
-from collections import defaultdict
+from utils.temporal_graph import TemporalGraph
+from utils.graph_snapshot import GraphSnapshotStore
+from utils.sketches import VelocityMonitor
 
 class TransactionAnalysisAgent:
     def __init__(self):
         """Initialize the agent with database connection."""
         self.db = AMLDatabase()
-        self.graph = nx.DiGraph()
+        self.temporal_graph = None
+        self._graph = None
+        self.snapshots = GraphSnapshotStore.for_database(self.db)
+        self.velocity_monitor = None
 
-    def build_transaction_network(self, df):
-        """Build a directed graph from transaction data."""
+    def build_transaction_network(self, df=None):
+        """Build a directed graph from transaction data.
+
+        Without `df` the graph comes from the persisted snapshot of the whole
+        database, so it is only rebuilt when the data has changed.
+        Detection runs on the temporal graph's arrays; the networkx view in
+        `self.graph` is only built if something reads it.
+        """
         print("🔗 Building transaction graph...")
-        for _, row in df.iterrows():
-            source = row['nameOrig']
-            target = row['nameDest']
-            amount = row['amount']
-            trans_type = row['type']
-            self.graph.add_edge(source, target, amount=amount, type=trans_type)
+        if df is None:
+            self.temporal_graph = self.snapshots.get(self.db)
+        else:
+            self.temporal_graph = TemporalGraph.from_dataframe(df)
+        self._graph = None
+
+    @property
+    def graph(self):
+        """networkx DiGraph over integer account ids (names via `self.temporal_graph.accounts`)."""
+        if self._graph is None and self.temporal_graph is not None:
+            self._graph = self.temporal_graph.to_networkx(names=False)
+        return self._graph
 
     def detect_smurfing(self, min_transactions=5, max_amount=5000):
-        """Detect smurfing: multiple small transactions from one source."""
+        """Detect smurfing: multiple small transactions from one source.
+
+        Counts every transaction below `max_amount` (repeat transfers to the
+        same recipient included), like the out-of-core path. A VelocityMonitor
+        over the small transactions pre-filters senders; only its candidates
+        are counted exactly from the temporal index.
+        """
         print("🧪 Detecting smurfing...")
+        tg = self.temporal_graph
+        if tg is None:
+            return []
+        small = tg.amount < max_amount
+        self.velocity_monitor = VelocityMonitor(min_count=min_transactions, expected_total=int(small.sum()))
+        self.velocity_monitor.update(tg.src[small], tg.dst[small], tg.step[small])
+        nodes = self.velocity_monitor.candidates
+        if nodes is None:
+            nodes = np.unique(tg.src[small])
+        print(f"🔭 {len(nodes)} candidate senders out of {tg.num_nodes} accounts.")
         smurfing_flags = []
-        for node in self.graph.nodes():
-            outgoing = [(u, v, d) for u, v, d in self.graph.out_edges(node, data=True)]
-            small_txns = [e for e in outgoing if e[2]['amount'] < max_amount]
-            if len(small_txns) >= min_transactions:
-                smurfing_flags.append((node, len(small_txns)))
+        for node in nodes.tolist():
+            n_small = int(small[tg._out_edges(node)].sum())
+            if n_small >= min_transactions:
+                smurfing_flags.append((node, n_small))
         return smurfing_flags
 
     def detect_round_tripping(self, max_cycle_length=3):
-        """Detect round-tripping: cycles in transaction flow."""
+        """Detect round-tripping: cycles of at most `max_cycle_length` accounts in transaction flow."""
         print("🌀 Detecting round-tripping...")
-        cycles = list(nx.simple_cycles(self.graph))
-        round_tripping_flags = [cycle for cycle in cycles if len(cycle) <= max_cycle_length]
-        return round_tripping_flags
+        tg = self.temporal_graph
+        if tg is None:
+            return []
+        # Drop cycles that can only be closed by going backwards in time
+        return [cycle for cycle in tg.find_cycles(max_cycle_length) if tg.is_time_respecting_node_cycle(cycle)]
+
+    def detect_layering(self, min_hops=3, window=24):
+        """Detect layering: funds passed on through several accounts within a step window."""
+        print("🪜 Detecting layering chains...")
+        if self.temporal_graph is None:
+            return []
+        return self.temporal_graph.find_layering_chains(min_hops=min_hops, window=window)
 
-    def analyze(self, df):
-        """Analyze transactions and flag suspicious cases."""
-        print(f"📊 Analyzing {len(df)} transactions...")
+    def trace_funds(self, transaction_id, max_hops=3, max_steps=None, direction="forward"):
+        """Trace where money went after (or came from before) a flagged transaction."""
+        if self.temporal_graph is None:
+            raise RuntimeError("Run analyze() before tracing funds.")
+        if direction == "forward":
+            return self.temporal_graph.trace_forward(transaction_id, max_hops=max_hops, max_steps=max_steps)
+        return self.temporal_graph.trace_backward(transaction_id, max_hops=max_hops, max_steps=max_steps)
+
+    def analyze(self, df=None):
+        """Analyze transactions (default: everything in the database) and flag suspicious cases."""
         self.build_transaction_network(df)
+        tg = self.temporal_graph
+        print(f"📊 Analyzing {tg.num_edges} transactions...")
+
+        # First transaction sent by each account id (in frame order)
+        first_txn = pd.Series(tg.transaction_id).groupby(tg.src).first()
+
+        # Flags are collected and written in one batch
+        flags = []
 
         # Detect smurfing
         smurfing_flags = self.detect_smurfing()
         for source, count in smurfing_flags:
-            txn = df[df['nameOrig'] == source].head(1)
-            if not txn.empty:
-                transaction_id = int(txn['id'].values[0])
-                self.db.flag_case(transaction_id, "TransactionAnalysis", f"Smurfing detected ({count} small txns)")
+            if source in first_txn.index:
+                transaction_id = int(first_txn[source])
+                flags.append((transaction_id, "TransactionAnalysis", f"Smurfing detected ({count} small txns)"))
 
         # Detect round-tripping
         round_tripping_flags = self.detect_round_tripping()
         for cycle in round_tripping_flags:
+            names = list(tg.accounts[cycle])
             for account in cycle:
-                txn = df[df['nameOrig'] == account].head(1)
-                if not txn.empty:
-                    transaction_id = int(txn['id'].values[0])
-                    self.db.flag_case(transaction_id, "TransactionAnalysis", f"Round-tripping in cycle {cycle}")
+                if account in first_txn.index:
+                    transaction_id = int(first_txn[account])
+                    flags.append((transaction_id, "TransactionAnalysis", f"Round-tripping in cycle {names}"))
                     break  # Only flag 1 transaction per cycle
 
-        print(f"✅ Flagged {len(smurfing_flags) + len(round_tripping_flags)} cases.")
+        # Detect layering chains (flag the transaction that starts each chain)
+        layering_flags = {}
+        for chain in self.detect_layering():
+            layering_flags.setdefault(chain[0], chain)  # One flag per starting transaction
+        for transaction_id, chain in layering_flags.items():
+            flags.append((transaction_id, "TransactionAnalysis", f"Layering chain through transactions {chain}"))
+
+        self.db.flag_cases(flags)
+
+        print(f"✅ Flagged {len(smurfing_flags) + len(round_tripping_flags) + len(layering_flags)} cases.")
+
+    def smurfing_candidates(self, chunks, min_transactions=5, max_amount=5000, expected_total=None):
+        """Sketch small-transaction senders over chunks and return those that may be smurfing.
+
+        Chunks need step, amount, origId and destId; `expected_total` is the
+        number of small transactions, used to size the sketch. Memory is fixed
+        by the sketches, and no sender that truly reaches `min_transactions`
+        is missed. Returns None if there were too many candidates to filter on.
+        """
+        print("🔭 Sketching sender velocity over chunks...")
+        self.velocity_monitor = VelocityMonitor(min_count=min_transactions, expected_total=expected_total)
+        for chunk in chunks:
+            self.velocity_monitor.update_frame(chunk[chunk['amount'] < max_amount])
+        candidates = self.velocity_monitor.candidates
+        if candidates is not None:
+            print(f"🔭 {len(candidates)} candidate senders.")
+        return candidates
+
+    def detect_smurfing_out_of_core(self, chunks, min_transactions=5, max_amount=5000, candidates=None):
+        """Detect smurfing from a stream of chunks using partial per-account aggregates.
+
+        Each chunk is reduced to (count, first transaction id) per sender of
+        small transactions and the partials are combined in a single final
+        reduce. With `candidates` (see `smurfing_candidates`) partials are
+        only kept for those senders.
+        """
+        print("🧪 Detecting smurfing over chunks...")
+        partials = []
+        for chunk in chunks:
+            small = chunk[chunk['amount'] < max_amount]
+            if candidates is not None:
+                small = small[small['origId'].isin(candidates)]
+            partials.append(small.groupby('origId')['id'].agg(count='size', first_id='min'))
+        if not partials:
+            return None
+        totals = pd.concat(partials).groupby(level=0).agg({'count': 'sum', 'first_id': 'min'})
+        return totals[totals['count'] >= min_transactions]
+
+    def analyze_out_of_core(self, chunksize=500_000, min_transactions=5, max_amount=5000):
+        """Analyze the transactions table chunk by chunk and flag smurfing.
+
+        Cycle and layering detection need the whole graph and stay on the
+        in-memory `analyze` path.
+        """
+        print("📊 Analyzing transactions out of core...")
+        if self.db.backend.columnar:
+            # Let the columnar engine filter and aggregate in one vectorized query
+            smurfing = self.db.account_aggregates(
+                "origId", where="amount < ?", params=(max_amount,), min_transactions=min_transactions
+            ).rename(columns={'n': 'count'})
+        else:
+            # Cheap sketch pass first, then exact totals for the candidate senders only
+            n_small = int(self.db.query_frame(
+                "SELECT COUNT(*) AS n FROM transactions WHERE amount < ?", (max_amount,)
+            )['n'].iloc[0])
+            candidates = self.smurfing_candidates(
+                self.db.iter_transactions(chunksize, columns=['step', 'amount', 'origId', 'destId']),
+                min_transactions, max_amount, expected_total=n_small
+            )
+            chunks = self.db.iter_transactions(chunksize, columns=['id', 'amount', 'origId'])
+            smurfing = self.detect_smurfing_out_of_core(chunks, min_transactions, max_amount, candidates)
+        if smurfing is None or smurfing.empty:
+            print("✅ Flagged 0 cases.")
+            return
+        self.db.flag_cases(
+            (first_id, "TransactionAnalysis", f"Smurfing detected ({count} small txns)")
+            for first_id, count in zip(smurfing['first_id'], smurfing['count'])
+        )
+        print(f"✅ Flagged {len(smurfing)} cases.")
 
 if __name__ == "__main__":
     from utils.data_loader import load_paysim_data
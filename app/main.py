@@ -1,20 +1,32 @@
 # aml_investigation_platform/app/main.py
 
+import uuid
 import streamlit as st
 import pandas as pd
 import networkx as nx
 import matplotlib.pyplot as plt
 from db.sqlite_db import AMLDatabase
-from agents.transaction_analysis import TransactionAnalysisAgent
-from agents.anomaly_detection import AnomalyDetectionAgent
-from agents.investigation import InvestigationAgent
+from utils.jobs import JobQueue, QUEUED, RUNNING, DONE, FINISHED_STATUSES
+from utils.graph_snapshot import GraphSnapshotStore
 
 st.set_page_config(page_title="AML Dashboard", layout="wide")
 st.title("💼 AML Investigation Platform")
 
 # Initialize DB + agents
 db = AMLDatabase()
-investigation_agent = InvestigationAgent()
+
+@st.cache_resource
+def get_job_queue():
+    """One queue (and worker pool) per Streamlit server, shared by all sessions."""
+    queue = JobQueue()
+    queue.start_workers()
+    return queue
+
+try:
+    job_queue = get_job_queue()
+except RuntimeError as e:
+    st.error(str(e))
+    st.stop()
 
 @st.cache_data
 def load_data():
@@ -27,9 +39,20 @@ def load_data():
 
 df = load_data()
 
+@st.cache_resource
+def load_graph(data_version):
+    """Memory-mapped graph snapshot, reloaded only when the data version changes."""
+    return GraphSnapshotStore.for_database(db).get(db)
+
 # Session state flags
 if "analysis_done" not in st.session_state:
     st.session_state.analysis_done = False
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if "analysis_job" not in st.session_state:
+    st.session_state.analysis_job = None
+if "report_job" not in st.session_state:
+    st.session_state.report_job = None
 
 # Layout Tabs
 tabs = st.tabs(["📊 Overview", "🕸️ Transaction Network", "🚨 Flagged Cases"])
@@ -39,12 +62,39 @@ with tabs[0]:
     st.subheader("🧠 Analysis Pipeline")
 
     if st.button("🚀 Run Analysis"):
-        st.write("🔍 Running Transaction Analysis...")
-        TransactionAnalysisAgent().analyze(df)
-        st.write("📊 Running Anomaly Detection...")
-        AnomalyDetectionAgent().analyze(df)
-        st.session_state.analysis_done = True
-        st.success("✅ Analysis Complete!")
+        st.session_state.analysis_job = job_queue.submit(
+            "analysis", submitted_by=st.session_state.session_id
+        )
+        st.session_state.analysis_done = False
+
+    @st.fragment(run_every=2)
+    def show_job_status():
+        """Poll the background job instead of running the agents in the script thread."""
+        job_id = st.session_state.analysis_job
+        if job_id is None:
+            return
+        job = job_queue.get(job_id)
+        st.progress(job["progress"], text=f"Job {job_id} ({job['status']}): {job['message']}")
+        if job["result"]:
+            st.json({k: v for k, v in job["result"].items() if k != "sar_reports"})
+        if job["status"] in (QUEUED, RUNNING):
+            if st.button("🛑 Cancel Analysis"):
+                job_queue.cancel(job_id)
+        elif job["status"] == DONE and not st.session_state.analysis_done:
+            st.session_state.analysis_done = True
+            st.success("✅ Analysis Complete!")
+            st.rerun()
+        elif job["status"] in FINISHED_STATUSES and job["status"] != DONE:
+            st.error(f"❌ Analysis {job['status']}: {job['message']}")
+
+    show_job_status()
+
+    with st.expander("📋 Recent analysis jobs"):
+        recent_jobs = pd.DataFrame(job_queue.list_jobs())
+        if recent_jobs.empty:
+            st.write("No jobs submitted yet.")
+        else:
+            st.dataframe(recent_jobs[["id", "status", "progress", "message", "submitted_by", "created_at"]])
 
     if st.session_state.analysis_done:
         st.info("✅ Data has been analyzed. Proceed to next tabs to review results.")
@@ -54,9 +104,8 @@ with tabs[0]:
 # ---------------------- NETWORK TAB --------------------------
 with tabs[1]:
     st.subheader("🕸️ Transaction Network Graph")
-    G = nx.DiGraph()
-    for _, row in df.head(100).iterrows():
-        G.add_edge(row['nameOrig'], row['nameDest'], amount=row['amount'])
+    graph = load_graph(db.data_version())
+    G = graph.to_networkx(edges=graph.edges_in_window()[:100])
 
     pos = nx.spring_layout(G, seed=42)
     plt.figure(figsize=(12, 8))
@@ -76,17 +125,36 @@ with tabs[2]:
         st.dataframe(flagged_df)
 
         if st.session_state.analysis_done:
-            st.write("📄 Generating SAR Reports...")
-            reports = investigation_agent.investigate()
-
-            for tid in flagged_df['transaction_id'].unique():
-                if tid in reports:
-                    st.download_button(
-                        label=f"⬇️ Download SAR for Transaction {tid}",
-                        data=reports[tid],
-                        file_name=f"sar_{tid}.txt",
-                        mime="text/plain"
-                    )
+            if st.button("📄 Generate SAR Reports"):
+                # SARs are written by a worker (no e-mails from this page), not in the script thread
+                st.session_state.report_job = job_queue.submit(
+                    "reports", {"max_emails": 0},
+                    submitted_by=st.session_state.session_id
+                )
+
+            @st.fragment(run_every=2)
+            def show_reports():
+                job_id = st.session_state.report_job
+                if job_id is None:
+                    return
+                job = job_queue.get(job_id)
+                if job["status"] in (QUEUED, RUNNING):
+                    st.progress(job["progress"], text=f"Job {job_id}: {job['message']}")
+                    return
+                if job["status"] != DONE:
+                    st.error(f"❌ SAR generation {job['status']}: {job['message']}")
+                    return
+                reports = job["result"].get("sar_reports", {})
+                for tid in flagged_df['transaction_id'].unique():
+                    if str(tid) in reports:
+                        st.download_button(
+                            label=f"⬇️ Download SAR for Transaction {tid}",
+                            data=reports[str(tid)],
+                            file_name=f"sar_{tid}.txt",
+                            mime="text/plain"
+                        )
+
+            show_reports()
         else:
             st.error("❌ Run analysis before generating SARs.")
     else:
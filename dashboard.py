@@ -1,14 +1,12 @@
+import uuid
 import streamlit as st
-import pandas as pd
 import matplotlib.pyplot as plt
 import plotly.express as px
 import networkx as nx
-from agents.transaction_analysis import TransactionAnalysisAgent
-from agents.anomaly_detection import AnomalyDetectionAgent
-from agents.investigation import InvestigationAgent
-from agents.regulatory_reporting import RegulatoryReportingAgent
 from db.sqlite_db import AMLDatabase
 from utils.data_loader import load_paysim_data
+from utils.jobs import JobQueue, QUEUED, RUNNING, DONE
+from utils.graph_snapshot import GraphSnapshotStore
 
 # Set page configuration as the first Streamlit command
 st.set_page_config(page_title="AML Investigation Dashboard", layout="wide")
@@ -16,6 +14,23 @@ st.set_page_config(page_title="AML Investigation Dashboard", layout="wide")
 # Initialize database outside cache
 db = AMLDatabase()
 
+# Shared job queue and worker pool (one per Streamlit server)
+@st.cache_resource
+def get_job_queue():
+    queue = JobQueue()
+    queue.start_workers()
+    return queue
+
+try:
+    job_queue = get_job_queue()
+except RuntimeError as e:
+    st.error(str(e))
+    st.stop()
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if "analysis_job" not in st.session_state:
+    st.session_state.analysis_job = None
+
 # Load and prepare data
 @st.cache_data
 def load_data(_db):
@@ -34,6 +49,11 @@ def load_data(_db):
     return sampled_df
 
 df = load_data(db)
+
+@st.cache_resource
+def load_graph(data_version):
+    """Memory-mapped graph snapshot, reloaded only when the data version changes."""
+    return GraphSnapshotStore.for_database(db).get(db)
 print(f"df columns: {df.columns.tolist()}")  # Debug
 print(f"df shape after load: {df.shape}")  # Debug
 if df.empty:
@@ -62,58 +82,61 @@ if selected_type != 'All':
 print(f"Filtered_df shape: {filtered_df.shape}")  # Debug
 print(f"Filtered_df columns: {filtered_df.columns.tolist()}")  # Debug
 
-# Initialize df_with_anomalies as empty DataFrame
-df_with_anomalies = pd.DataFrame()
-
-# Run agents in a separate function with fallback
-def run_agents(_db, _filtered_df):
-    ta_agent = TransactionAnalysisAgent()
-    ad_agent = AnomalyDetectionAgent()
-    inv_agent = InvestigationAgent()
-    rr_agent = RegulatoryReportingAgent()
-    try:
-        ta_agent.analyze(_filtered_df)
-        print(f"Transaction Analysis completed. Flagged cases: {len(_db.get_flagged_cases())}")
-        global df_with_anomalies
-        df_with_anomalies = ad_agent.analyze(_filtered_df)
-        print(f"Anomaly Detection completed. Anomalies: {df_with_anomalies['is_anomaly'].sum()}")
-        print(f"df_with_anomalies columns: {df_with_anomalies.columns.tolist()}")
-        inv_agent.investigate()
-        max_emails = 10
-        email_count = 0
-        processed_txs = set()
-        flagged_cases = _db.get_flagged_cases()
-        print(f"Flagged cases structure: {flagged_cases.columns.tolist()}")
-        for case in flagged_cases.itertuples():
-            tx_id = case.id if 'id' in flagged_cases.columns else case.Index
-            if tx_id not in processed_txs and email_count < max_emails:
-                processed_txs.add(tx_id)
-                rr_agent.generate_reports([flagged_cases.loc[case.Index]])
-                email_count += 1
-        print(f"Generated {email_count} SAR emails (limited to {max_emails})")
-    except Exception as e:
-        st.error(f"Error running agents: {str(e)}")
-
-# Run agents
-run_agents(db, filtered_df)
-
-# Overview Page
+# Run agents as a background job over the current filters
+st.sidebar.header("Analysis")
+if st.sidebar.button("Run Analysis"):
+    # The full slider range is sent as "no filter", so the run refreshes the shared anomaly scores
+    st.session_state.analysis_job = job_queue.submit("analysis", {
+        "min_step": None if min_step == int(df['step'].min()) else int(min_step),
+        "max_step": None if max_step == int(df['step'].max()) else int(max_step),
+        "txn_type": None if selected_type == 'All' else str(selected_type),
+        "generate_reports": True,
+        "max_emails": 10,
+    }, submitted_by=st.session_state.session_id)
+
+@st.fragment(run_every=2)
+def show_job_status():
+    job_id = st.session_state.analysis_job
+    if job_id is None:
+        st.write("No analysis submitted in this session.")
+        return
+    job = job_queue.get(job_id)
+    st.progress(job["progress"], text=f"Job {job_id}: {job['status']}")
+    st.caption(job["message"])
+    if job["status"] in (QUEUED, RUNNING):
+        if st.button("Cancel Analysis"):
+            job_queue.cancel(job_id)
+    elif job["status"] == DONE and st.session_state.get("rendered_job") != job_id:
+        # Re-render the page once with the new results
+        st.session_state.rendered_job = job_id
+        st.rerun()
+
+with st.sidebar:
+    show_job_status()
+
+# Overview Page (rendered from the summary tables, not the raw rows)
 if page == "Overview":
     st.header("Dashboard Overview")
-    st.write(f"Total Transactions: {len(filtered_df)}")
-    st.write(f"Flagged Anomalies: {df_with_anomalies['is_anomaly'].sum() if 'is_anomaly' in df_with_anomalies.columns else 0}")
-    st.write(f"Flagged Cases: {len(db.get_flagged_cases())}")
+    txn_summary = db.get_transaction_summary(min_step, max_step, None if selected_type == 'All' else selected_type)
+    score_hist = db.get_score_histogram()
+    st.write(f"Total Transactions: {int(txn_summary['n'].sum())}")
+    st.write(f"Flagged Anomalies: {int(score_hist['n_anomaly'].sum())}")
+    st.write(f"Flagged Cases: {int(db.get_flag_counts().sum())}")
+    quantiles = db.get_amount_quantiles()
+    st.write("Amount quantiles (approx.): " + ", ".join(f"p{int(q * 100)} ${v:,.2f}" for q, v in quantiles.items()))
+    if not txn_summary.empty:
+        st.bar_chart(txn_summary.groupby('type')['n'].sum())
 
 # Transaction Network Page
 elif page == "Transaction Network":
     st.header("Transaction Network Analysis")
     try:
-        if filtered_df.empty:
+        graph = load_graph(db.data_version())
+        edges = graph.edges_in_window(min_step, max_step, None if selected_type == 'All' else selected_type)
+        if len(edges) == 0:
             st.write("No data to display in the current filter.")
         else:
-            G = nx.DiGraph()
-            for _, row in filtered_df.iterrows():
-                G.add_edge(row['nameOrig'], row['nameDest'], amount=row['amount'])
+            G = graph.to_networkx(edges)
             if G.number_of_edges() > 0:
                 pos = nx.spring_layout(G)
                 plt.figure(figsize=(10, 6))
@@ -132,22 +155,29 @@ elif page == "Transaction Network":
 elif page == "Anomaly Detection":
     st.header("Anomaly Detection Analysis")
     try:
-        if 'is_anomaly' not in df_with_anomalies.columns or df_with_anomalies.empty:
+        density = db.get_anomaly_density()
+        if density.empty:
             st.write("No anomaly data to display.")
         else:
-            fig = px.scatter(df_with_anomalies, x="amount", y="anomaly_score", color="is_anomaly",
-                            color_discrete_map={0: "blue", 1: "red"},
-                            title="Anomaly Score vs. Transaction Amount",
-                            labels={"amount": "Transaction Amount ($)", "anomaly_score": "Anomaly Score"})
-            fig.update_traces(marker=dict(size=8))
+            # One marker per (amount, score) bin, sized by how many transactions fall in it
+            density['anomaly_share'] = density['n_anomaly'] / density['n']
+            fig = px.scatter(density, x="amount", y="score", size="n", color="anomaly_share",
+                            color_continuous_scale=["blue", "red"], log_x=True,
+                            hover_data={"n": True, "n_anomaly": True},
+                            title="Anomaly Score vs. Transaction Amount (binned)",
+                            labels={"amount": "Transaction Amount ($)", "score": "Anomaly Score",
+                                    "anomaly_share": "Share of anomalies"})
             st.plotly_chart(fig)
+
+            score_hist = db.get_score_histogram()
+            st.bar_chart(score_hist.set_index('lower')[['n', 'n_anomaly']])
     except Exception as e:
         st.error(f"Error in scatter plot: {str(e)}")
 
     # Network graph of anomalies
     st.subheader("Anomaly Transaction Network")
     try:
-        anomalous_df = df_with_anomalies[df_with_anomalies['is_anomaly'] == 1]
+        anomalous_df = filtered_df.merge(db.get_anomaly_scores(only_anomalies=True), on='id', how='inner')
         if anomalous_df.empty:
             st.write("No anomalous transactions to display.")
         else:
@@ -172,11 +202,10 @@ elif page == "Anomaly Detection":
 elif page == "Investigation Summary":
     st.header("Investigation Case Summary")
     try:
-        flagged_cases = db.get_flagged_cases()
-        if flagged_cases.empty or 'agent_type' not in flagged_cases.columns:
+        case_counts = db.get_flag_counts()
+        if case_counts.empty:
             st.write("No flagged cases or agent types to display.")
         else:
-            case_counts = flagged_cases['agent_type'].value_counts()
             fig, ax = plt.subplots(figsize=(8, 5))
             case_counts.plot(kind='bar', ax=ax, color=['#FF9999', '#66B2FF', '#99FF99', '#FFCC99'])
             ax.set_title("Flagged Cases by Agent Type")
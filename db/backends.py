@@ -0,0 +1,217 @@
+# aml_investigation_platform/db/backends.py
+
+import os
+import sqlite3
+import pandas as pd
+
+# Backend used when AMLDatabase is created without one: "sqlite" or "duckdb"
+DEFAULT_BACKEND = os.getenv("AML_DB_BACKEND", "sqlite").lower()
+
+
+class StorageBackend:
+    """Connection and SQL-dialect layer behind AMLDatabase.
+
+    AMLDatabase writes portable SQL (qmark parameters, ON CONFLICT upserts,
+    TEMP tables) and delegates everything engine-specific to a backend:
+    opening connections, moving DataFrames in and out, DDL differences and
+    Arrow/NumPy result hand-off.
+    """
+
+    name = None
+    default_path = None
+    columnar = False  # True if heavy aggregations should be pushed into the engine
+    multi_process = True  # False if only one process may open the database file at a time
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or self.default_path
+
+    def connect(self):
+        raise NotImplementedError
+
+    def commit(self, conn):
+        conn.commit()
+
+    def serial_primary_key(self, conn, table):
+        """DDL for an auto-incrementing integer primary key column."""
+        raise NotImplementedError
+
+    def foreign_key(self, column, reference):
+        """DDL for a foreign key clause (empty if the engine should not enforce one)."""
+        return f", FOREIGN KEY ({column}) REFERENCES {reference}"
+
+    def create_index(self, conn, name, table, columns):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+    def table_exists(self, conn, table):
+        raise NotImplementedError
+
+    def load_temp_table(self, conn, name, columns, rows):
+        """Create TEMP table `name` (`columns` DDL) filled with `rows` (tuples or a DataFrame)."""
+        conn.execute(f"DROP TABLE IF EXISTS {name}")
+        conn.execute(f"CREATE TEMP TABLE {name} ({columns})")
+        if isinstance(rows, pd.DataFrame):
+            rows = rows.itertuples(index=False, name=None)
+        placeholders = ", ".join("?" for _ in columns.split(","))
+        conn.executemany(f"INSERT INTO {name} VALUES ({placeholders})", list(rows))
+
+    def table_columns(self, conn, table):
+        cursor = conn.execute(f"SELECT * FROM {table} LIMIT 0")
+        return [desc[0] for desc in cursor.description]
+
+    def read_frame(self, conn, sql, params=()):
+        raise NotImplementedError
+
+    def iter_frames(self, sql, chunksize, params=()):
+        """Yield query results in DataFrames of at most `chunksize` rows on a dedicated connection."""
+        raise NotImplementedError
+
+    def write_frame(self, conn, table, df, if_exists="append", chunksize=50_000):
+        raise NotImplementedError
+
+    def read_arrow(self, conn, sql, params=()):
+        """Return query results as a pyarrow.Table."""
+        import pyarrow as pa
+        return pa.Table.from_pandas(self.read_frame(conn, sql, params), preserve_index=False)
+
+    def read_numpy(self, conn, sql, params=()):
+        """Return query results as a dict of NumPy arrays keyed by column."""
+        df = self.read_frame(conn, sql, params)
+        return {column: df[column].to_numpy() for column in df.columns}
+
+
+class SQLiteBackend(StorageBackend):
+    """Row-oriented SQLite file; the default for small deployments."""
+
+    name = "sqlite"
+    default_path = "db/aml_database.db"
+
+    def connect(self):
+        return sqlite3.connect(self.db_path)
+
+    def serial_primary_key(self, conn, table):
+        return "id INTEGER PRIMARY KEY AUTOINCREMENT"
+
+    def table_exists(self, conn, table):
+        row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        return row is not None
+
+    def read_frame(self, conn, sql, params=()):
+        return pd.read_sql_query(sql, conn, params=list(params))
+
+    def iter_frames(self, sql, chunksize, params=()):
+        conn = self.connect()
+        try:
+            for chunk in pd.read_sql_query(sql, conn, params=list(params), chunksize=chunksize):
+                yield chunk
+        finally:
+            conn.close()
+
+    def write_frame(self, conn, table, df, if_exists="append", chunksize=50_000):
+        df.to_sql(table, conn, if_exists=if_exists, index=False, chunksize=chunksize)
+
+
+class DuckDBBackend(StorageBackend):
+    """Embedded columnar engine (DuckDB) for large analytical workloads.
+
+    Queries run vectorized inside the engine and results come back through
+    Arrow. DuckDB locks the file to a single process, so background job
+    workers refuse to run on it (see utils.jobs).
+    """
+
+    name = "duckdb"
+    default_path = "db/aml_database.duckdb"
+    columnar = True
+    multi_process = False
+
+    def __init__(self, db_path=None):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("❌ The DuckDB backend needs the 'duckdb' package (pip install duckdb pyarrow).") from e
+        self._duckdb = duckdb
+        super().__init__(db_path)
+
+    def connect(self):
+        return self._duckdb.connect(self.db_path)
+
+    def commit(self, conn):
+        # DuckDB connections autocommit unless a transaction was opened explicitly
+        pass
+
+    def serial_primary_key(self, conn, table):
+        conn.execute(f"CREATE SEQUENCE IF NOT EXISTS {table}_id_seq")
+        return f"id INTEGER PRIMARY KEY DEFAULT nextval('{table}_id_seq')"
+
+    def foreign_key(self, column, reference):
+        # The referenced transactions table is replaced on ingest, which an enforced key would block
+        return ""
+
+    def create_index(self, conn, name, table, columns):
+        # Columnar scans with zone maps make secondary indexes unnecessary and they slow appends
+        pass
+
+    def table_exists(self, conn, table):
+        row = conn.execute(
+            "SELECT 1 FROM information_schema.tables WHERE table_name = ?", (table,)
+        ).fetchone()
+        return row is not None
+
+    def load_temp_table(self, conn, name, columns, rows):
+        # Bulk-load through a registered frame; executemany runs one statement per row
+        conn.execute(f"DROP TABLE IF EXISTS {name}")
+        conn.execute(f"CREATE TEMP TABLE {name} ({columns})")
+        frame = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+        if frame.empty:
+            return
+        conn.register("_incoming_rows", frame)
+        try:
+            conn.execute(f"INSERT INTO {name} SELECT * FROM _incoming_rows")
+        finally:
+            conn.unregister("_incoming_rows")
+
+    def read_frame(self, conn, sql, params=()):
+        return conn.execute(sql, list(params)).df()
+
+    def iter_frames(self, sql, chunksize, params=()):
+        conn = self.connect()
+        try:
+            reader = conn.execute(sql, list(params)).fetch_record_batch(chunksize)
+            for batch in reader:
+                yield batch.to_pandas()
+        finally:
+            conn.close()
+
+    def write_frame(self, conn, table, df, if_exists="append", chunksize=50_000):
+        # Categoricals would become ENUM columns whose categories differ per chunk
+        df = df.astype({c: str for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)})
+        conn.register("_incoming_frame", df)
+        try:
+            if if_exists == "replace" or not self.table_exists(conn, table):
+                conn.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT * FROM _incoming_frame")
+            else:
+                conn.execute(f"INSERT INTO {table} BY NAME SELECT * FROM _incoming_frame")
+        finally:
+            conn.unregister("_incoming_frame")
+
+    def read_arrow(self, conn, sql, params=()):
+        # .arrow() returns a RecordBatchReader on newer DuckDB releases
+        return conn.execute(sql, list(params)).fetch_arrow_table()
+
+    def read_numpy(self, conn, sql, params=()):
+        return conn.execute(sql, list(params)).fetchnumpy()
+
+
+BACKENDS = {
+    SQLiteBackend.name: SQLiteBackend,
+    DuckDBBackend.name: DuckDBBackend,
+}
+
+
+def get_backend(backend=None, db_path=None):
+    """Return a StorageBackend instance from a name, an instance, or the AML_DB_BACKEND default."""
+    if isinstance(backend, StorageBackend):
+        return backend
+    name = (backend or DEFAULT_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+    return BACKENDS[name](db_path)
@@ -1,11 +1,20 @@
-import sqlite3
 import pandas as pd
 import os
+import uuid
+import numpy as np
+from db.backends import get_backend
+from utils.accounts import ACCOUNT_COLUMNS
+from utils import rollups
 
 class AMLDatabase:
-    def __init__(self, db_path="db/aml_database.db"):
-        """Initialize the SQLite database connection and create tables."""
-        self.db_path = db_path
+    def __init__(self, db_path=None, backend=None):
+        """Initialize the database connection and create tables.
+
+        `backend` is "sqlite" (default), "duckdb" or a StorageBackend instance;
+        without one the AML_DB_BACKEND environment variable decides.
+        """
+        self.backend = get_backend(backend, db_path)
+        self.db_path = self.backend.db_path
         self.conn = None
         self._ensure_directory()
         self.create_tables()
@@ -18,7 +27,7 @@ class AMLDatabase:
 
     def connect(self):
         """Open database connection."""
-        self.conn = sqlite3.connect(self.db_path)
+        self.conn = self.backend.connect()
 
     def close(self):
         """Close database connection."""
@@ -29,77 +38,592 @@ class AMLDatabase:
     def create_tables(self):
         """Create necessary tables."""
         self.connect()
-        cursor = self.conn.cursor()
 
         # Transactions table
-        cursor.execute('''
+        self.conn.execute(f'''
             CREATE TABLE IF NOT EXISTS transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                {self.backend.serial_primary_key(self.conn, 'transactions')},
                 step INTEGER,
                 type TEXT,
                 amount REAL,
-                nameOrig TEXT,
-                nameDest TEXT,
+                origId INTEGER,
+                destId INTEGER,
                 isFraud INTEGER,
                 isFlaggedFraud INTEGER
             )
         ''')
 
+        # Account dictionary: transactions store integer ids, names live here
+        self.conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS accounts (
+                {self.backend.serial_primary_key(self.conn, 'accounts')},
+                name TEXT UNIQUE NOT NULL
+            )
+        ''')
+
         # Flagged cases table
-        cursor.execute('''
+        self.conn.execute(f'''
             CREATE TABLE IF NOT EXISTS flagged_cases (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                {self.backend.serial_primary_key(self.conn, 'flagged_cases')},
                 transaction_id INTEGER,
                 agent_type TEXT,
                 flag_reason TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (transaction_id) REFERENCES transactions(id)
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                {self.backend.foreign_key('transaction_id', 'transactions(id)')}
             )
         ''')
 
-        self.conn.commit()
+        # Key/value metadata (e.g. the data version that graph snapshots are keyed on)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        # Identity of this database's data, so snapshots of another (or a recreated) DB are never reused
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('data_identity', ?) ON CONFLICT (key) DO NOTHING",
+            (uuid.uuid4().hex,)
+        )
+
+        # Summary tables, maintained at ingest/flag time so dashboards never scan raw rows
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS summary_txn_counts (
+                step INTEGER,
+                type TEXT,
+                n INTEGER,
+                amount_sum REAL,
+                n_fraud INTEGER,
+                PRIMARY KEY (step, type)
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS summary_amount_hist (
+                bin INTEGER PRIMARY KEY,
+                n INTEGER
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS summary_flag_counts (
+                agent_type TEXT PRIMARY KEY,
+                n INTEGER
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS summary_score_hist (
+                bin INTEGER PRIMARY KEY,
+                n INTEGER,
+                n_anomaly INTEGER
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS summary_anomaly_density (
+                amount_bin INTEGER,
+                score_bin INTEGER,
+                n INTEGER,
+                n_anomaly INTEGER,
+                PRIMARY KEY (amount_bin, score_bin)
+            )
+        ''')
+
+        # Databases filled before the summary tables existed start with empty rollups
+        needs_refresh = self.conn.execute("SELECT 1 FROM summary_txn_counts LIMIT 1").fetchone() is None and \
+            self.conn.execute("SELECT 1 FROM transactions LIMIT 1").fetchone() is not None
+
+        self.backend.commit(self.conn)
         self.close()
+        if needs_refresh:
+            print("🔄 Building summary tables for an existing database...")
+            self.refresh_summaries()
+
+    def _account_ids(self, names) -> np.ndarray:
+        """Map account names to their ids in the accounts table, adding names not seen before.
 
-    def insert_transactions(self, df: pd.DataFrame):
-        """Insert a DataFrame of transactions into the database."""
+        Only this batch's distinct names are held in memory; the dictionary
+        itself stays in the database (connection must be open).
+        """
+        codes, uniques = pd.factorize(np.asarray(names, dtype=object))
+        self._load_temp_table("incoming_accounts", "name TEXT", pd.DataFrame({'name': uniques}))
+        self.conn.execute('''
+            INSERT INTO accounts (name) SELECT name FROM incoming_accounts WHERE true
+            ON CONFLICT (name) DO NOTHING
+        ''')
+        known = self.backend.read_frame(self.conn, '''
+            SELECT i.name, a.id FROM incoming_accounts i JOIN accounts a ON a.name = i.name
+        ''')
+        ids = known['id'].to_numpy(dtype=np.int64)[pd.Index(known['name']).get_indexer(uniques)]
+        return ids[codes]
+
+    def account_names(self, account_ids) -> pd.Index:
+        """Names of the given account ids, in the same order."""
+        account_ids = np.asarray(account_ids, dtype=np.int64)
+        self.connect()
+        self._load_temp_table("lookup_accounts", "id INTEGER", pd.DataFrame({'id': np.unique(account_ids)}))
+        known = self.backend.read_frame(self.conn, '''
+            SELECT l.id, a.name FROM lookup_accounts l LEFT JOIN accounts a ON a.id = l.id
+        ''')
+        self.close()
+        names = known['name'].to_numpy(dtype=object)[pd.Index(known['id']).get_indexer(account_ids)]
+        return pd.Index(names, dtype=object)
+
+    def insert_transactions(self, df: pd.DataFrame, append: bool = False, chunksize: int = 50_000):
+        """Insert a DataFrame of transactions into the database.
+
+        Account names are stored as integer ids (origId/destId) from the
+        accounts table. By default the table is replaced; pass `append=True`
+        to add to it (used when ingesting chunk by chunk).
+        """
         if df.empty:
             print("⚠️ DataFrame is empty. No transactions inserted.")
             return
         self.connect()
-        df.to_sql('transactions', self.conn, if_exists='replace', index=False)
-        self.conn.commit()
+        n = len(df)
+        ids = self._account_ids(np.concatenate([df['nameOrig'].to_numpy(dtype=object),
+                                                df['nameDest'].to_numpy(dtype=object)]))
+        encoded = df.drop(columns=list(ACCOUNT_COLUMNS))
+        encoded['origId'], encoded['destId'] = ids[:n], ids[n:]
+        self.backend.write_frame(self.conn, 'transactions', encoded,
+                                 if_exists='append' if append else 'replace', chunksize=chunksize)
+        self._create_transaction_indexes()
+        self._update_transaction_summaries(df, reset=not append)
+        self._bump_data_version(replaced=not append)
+        self.backend.commit(self.conn)
         self.close()
         print(f"✅ Inserted {len(df)} transactions into the database.")
 
+    def _create_transaction_indexes(self):
+        """Index the transactions table for id lookups and per-account history (connection must be open)."""
+        self.backend.create_index(self.conn, "idx_transactions_id", "transactions", "id")
+        self.backend.create_index(self.conn, "idx_transactions_orig", "transactions", "origId, step")
+        self.backend.create_index(self.conn, "idx_transactions_dest", "transactions", "destId, step")
+
+    def _bump_data_version(self, replaced: bool):
+        """Advance the data version (connection must be open).
+
+        `base_version` and the data identity change only when the table is
+        replaced, so data with the same base only ever grew by appends since then.
+        """
+        version, base_version, identity = self._read_data_version()
+        version += 1
+        if replaced:
+            base_version = version
+            identity = uuid.uuid4().hex
+        self.conn.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            [("data_version", str(version)), ("data_base_version", str(base_version)), ("data_identity", identity)]
+        )
+
+    def _read_data_version(self):
+        rows = dict(self.conn.execute(
+            "SELECT key, value FROM meta WHERE key IN ('data_version', 'data_base_version', 'data_identity')"
+        ).fetchall())
+        return int(rows.get("data_version", 0)), int(rows.get("data_base_version", 0)), rows.get("data_identity")
+
+    def data_version(self):
+        """Return (data_version, base_version, identity) of the transactions table."""
+        self.connect()
+        version = self._read_data_version()
+        self.close()
+        return version
+
+    def ingest_chunks(self, chunks) -> int:
+        """Load an iterable of transaction chunks, replacing the existing table."""
+        total = 0
+        for i, chunk in enumerate(chunks):
+            self.insert_transactions(chunk, append=i > 0)
+            total += len(chunk)
+        print(f"✅ Ingested {total} transactions in chunks.")
+        return total
+
+    def iter_transactions(self, chunksize: int = 500_000, columns=None, where=None, params=()):
+        """Yield the transactions table as DataFrames of at most `chunksize` rows.
+
+        Accounts come back as origId/destId. `where` is an optional SQL condition.
+        """
+        cols = ", ".join(columns) if columns else "*"
+        sql = f"SELECT {cols} FROM transactions" + (f" WHERE {where}" if where else "")
+        yield from self.backend.iter_frames(sql, chunksize, params)
+
+    def get_transactions(self, min_step=None, max_step=None, txn_type=None) -> pd.DataFrame:
+        """Load transactions (optionally filtered by step range and type) with names decoded.
+
+        origId/destId are kept next to nameOrig/nameDest.
+        """
+        conditions, params = [], []
+        if min_step is not None:
+            conditions.append("t.step >= ?")
+            params.append(int(min_step))
+        if max_step is not None:
+            conditions.append("t.step <= ?")
+            params.append(int(max_step))
+        if txn_type is not None:
+            conditions.append("t.type = ?")
+            params.append(txn_type)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        self.connect()
+        df = self.backend.read_frame(self.conn, f'''
+            SELECT t.*, ao.name AS nameOrig, ad.name AS nameDest
+            FROM transactions t
+            LEFT JOIN accounts ao ON ao.id = t.origId
+            LEFT JOIN accounts ad ON ad.id = t.destId{where}
+            ORDER BY t.id
+        ''', params)
+        self.close()
+        return df
+
+    def save_anomaly_scores(self, df: pd.DataFrame, summaries=None):
+        """Store the latest anomaly scores (id, anomaly_score, is_anomaly) and their rollups.
+
+        The rollups are computed from `df` (which then needs `amount`) unless
+        precomputed `summaries` are given, e.g. when `df` only holds anomalies.
+        """
+        self.connect()
+        self.backend.write_frame(self.conn, 'anomaly_scores', df[['id', 'anomaly_score', 'is_anomaly']],
+                                 if_exists='replace')
+        self.backend.commit(self.conn)
+        self.close()
+        if summaries is None:
+            summaries = rollups.score_histogram(df['anomaly_score'], df['is_anomaly']) + \
+                rollups.anomaly_density(df['amount'], df['anomaly_score'], df['is_anomaly'])
+        self.save_anomaly_summaries(*summaries)
+
+    def get_anomaly_scores(self, only_anomalies: bool = False) -> pd.DataFrame:
+        """Retrieve the latest anomaly scores, or an empty frame if none were saved."""
+        self.connect()
+        exists = self.backend.table_exists(self.conn, 'anomaly_scores')
+        where = " WHERE is_anomaly = 1" if only_anomalies else ""
+        df = self.backend.read_frame(self.conn, f"SELECT * FROM anomaly_scores{where}") if exists else \
+            pd.DataFrame(columns=['id', 'anomaly_score', 'is_anomaly'])
+        self.close()
+        return df
+
+    # ------------------------------------------------------------------
+    # Summary tables (rollups)
+    # ------------------------------------------------------------------
+    def _update_transaction_summaries(self, df: pd.DataFrame, reset: bool = False):
+        """Add a batch of raw transactions to the count and amount rollups (connection must be open)."""
+        self._write_transaction_summaries(rollups.transaction_counts(df), rollups.amount_histogram(df['amount']), reset)
+
+    def _write_transaction_summaries(self, counts: pd.DataFrame, hist, reset: bool = False):
+        """Merge precomputed (step, type) counts and an amount histogram into the rollups."""
+        if reset:
+            self.conn.execute("DELETE FROM summary_txn_counts")
+            self.conn.execute("DELETE FROM summary_amount_hist")
+        self.conn.executemany('''
+            INSERT INTO summary_txn_counts (step, type, n, amount_sum, n_fraud) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (step, type) DO UPDATE SET
+                n = n + excluded.n, amount_sum = amount_sum + excluded.amount_sum, n_fraud = n_fraud + excluded.n_fraud
+        ''', list(zip(counts['step'].astype(int).tolist(), counts['type'].astype(str).tolist(), counts['n'].tolist(),
+                      counts['amount_sum'].tolist(), counts['n_fraud'].astype(int).tolist())))
+        bins = np.flatnonzero(hist)
+        self.conn.executemany('''
+            INSERT INTO summary_amount_hist (bin, n) VALUES (?, ?)
+            ON CONFLICT (bin) DO UPDATE SET n = n + excluded.n
+        ''', list(zip(bins.tolist(), hist[bins].tolist())))
+
+    def _update_flag_counts(self, counts):
+        """Increment per-agent flag counts (connection must be open)."""
+        self.conn.executemany('''
+            INSERT INTO summary_flag_counts (agent_type, n) VALUES (?, ?)
+            ON CONFLICT (agent_type) DO UPDATE SET n = n + excluded.n
+        ''', [(agent, int(n)) for agent, n in counts.items()])
+
+    def save_anomaly_summaries(self, score_counts, score_anomalies, density_counts, density_anomalies):
+        """Replace the anomaly-score histogram and the binned amount/score density."""
+        self.connect()
+        self.conn.execute("DELETE FROM summary_score_hist")
+        self.conn.execute("DELETE FROM summary_anomaly_density")
+        bins = np.flatnonzero(score_counts)
+        self.conn.executemany(
+            "INSERT INTO summary_score_hist (bin, n, n_anomaly) VALUES (?, ?, ?)",
+            list(zip(bins.tolist(), score_counts[bins].tolist(), score_anomalies[bins].tolist()))
+        )
+        cells = rollups.density_frame(density_counts, density_anomalies)
+        self.conn.executemany(
+            "INSERT INTO summary_anomaly_density (amount_bin, score_bin, n, n_anomaly) VALUES (?, ?, ?, ?)",
+            list(zip(cells['amount_bin'].tolist(), cells['score_bin'].tolist(), cells['n'].tolist(),
+                     cells['n_anomaly'].tolist()))
+        )
+        self.backend.commit(self.conn)
+        self.close()
+
+    def refresh_summaries(self, chunksize: int = 500_000):
+        """Rebuild all rollups from the base tables (e.g. for an existing DB)."""
+        # Aggregate everything first: the chunk reader holds a read lock until it is exhausted
+        partials, hist = [], np.zeros(len(rollups.AMOUNT_BINS) - 1, dtype=np.int64)
+        for chunk in self.iter_transactions(chunksize, columns=['step', 'type', 'amount', 'isFraud']):
+            partials.append(rollups.transaction_counts(chunk))
+            hist += rollups.amount_histogram(chunk['amount'])
+        counts = pd.concat(partials).groupby(['step', 'type'], as_index=False).sum() if partials else \
+            pd.DataFrame(columns=['step', 'type', 'n', 'amount_sum', 'n_fraud'])
+
+        self.connect()
+        has_scores = self.backend.table_exists(self.conn, 'anomaly_scores')
+        self.close()
+        score_summaries = None
+        if has_scores:
+            scored = self.backend.iter_frames('''
+                SELECT s.anomaly_score, s.is_anomaly, t.amount
+                FROM anomaly_scores s JOIN transactions t ON t.id = s.id
+            ''', chunksize)
+            for chunk in scored:
+                partial = rollups.score_histogram(chunk['anomaly_score'], chunk['is_anomaly']) + \
+                    rollups.anomaly_density(chunk['amount'], chunk['anomaly_score'], chunk['is_anomaly'])
+                score_summaries = partial if score_summaries is None else \
+                    tuple(a + b for a, b in zip(score_summaries, partial))
+
+        self.connect()
+        self._write_transaction_summaries(counts, hist, reset=True)
+        self.conn.execute("DELETE FROM summary_flag_counts")
+        self.conn.execute('''
+            INSERT INTO summary_flag_counts (agent_type, n)
+            SELECT agent_type, COUNT(*) FROM flagged_cases GROUP BY agent_type
+        ''')
+        self.backend.commit(self.conn)
+        self.close()
+        if score_summaries is not None:
+            self.save_anomaly_summaries(*score_summaries)
+
+    def get_transaction_summary(self, min_step=None, max_step=None, txn_type=None) -> pd.DataFrame:
+        """Per (step, type) counts from the rollup, optionally filtered like the dashboard sidebar."""
+        conditions, params = [], []
+        if min_step is not None:
+            conditions.append("step >= ?")
+            params.append(int(min_step))
+        if max_step is not None:
+            conditions.append("step <= ?")
+            params.append(int(max_step))
+        if txn_type is not None:
+            conditions.append("type = ?")
+            params.append(txn_type)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        self.connect()
+        df = self.backend.read_frame(self.conn, f"SELECT * FROM summary_txn_counts{where}", params)
+        self.close()
+        return df
+
+    def get_flag_counts(self) -> pd.Series:
+        """Number of flagged cases per agent type."""
+        self.connect()
+        df = self.backend.read_frame(self.conn, "SELECT agent_type, n FROM summary_flag_counts ORDER BY n DESC")
+        self.close()
+        return df.set_index('agent_type')['n']
+
+    def get_amount_quantiles(self, quantiles=(0.5, 0.95, 0.99)) -> dict:
+        """Approximate amount quantiles from the log-binned amount histogram."""
+        self.connect()
+        rows = self.conn.execute("SELECT bin, n FROM summary_amount_hist").fetchall()
+        self.close()
+        counts = np.zeros(len(rollups.AMOUNT_BINS) - 1)
+        for bin_index, n in rows:
+            counts[bin_index] = n
+        return dict(zip(quantiles, rollups.quantiles_from_histogram(counts, quantiles)))
+
+    def get_score_histogram(self) -> pd.DataFrame:
+        """Anomaly-score histogram with bin edges."""
+        self.connect()
+        df = self.backend.read_frame(self.conn, "SELECT bin, n, n_anomaly FROM summary_score_hist ORDER BY bin")
+        self.close()
+        df['lower'] = rollups.SCORE_BINS[df['bin']]
+        df['upper'] = rollups.SCORE_BINS[df['bin'] + 1]
+        return df
+
+    def get_anomaly_density(self) -> pd.DataFrame:
+        """Binned (amount, score) density cells for the Anomaly page scatter."""
+        self.connect()
+        df = self.backend.read_frame(self.conn, "SELECT amount_bin, score_bin, n, n_anomaly FROM summary_anomaly_density")
+        self.close()
+        counts = np.zeros((len(rollups.DENSITY_AMOUNT_BINS) - 1, len(rollups.DENSITY_SCORE_BINS) - 1), dtype=np.int64)
+        anomalies = np.zeros_like(counts)
+        counts[df['amount_bin'], df['score_bin']] = df['n']
+        anomalies[df['amount_bin'], df['score_bin']] = df['n_anomaly']
+        return rollups.density_frame(counts, anomalies)
+
     def flag_case(self, transaction_id: int, agent_type: str, flag_reason: str):
         """Flag a specific transaction."""
         self.connect()
-        cursor = self.conn.cursor()
-        cursor.execute('''
+        self.conn.execute('''
             INSERT INTO flagged_cases (transaction_id, agent_type, flag_reason)
             VALUES (?, ?, ?)
         ''', (transaction_id, agent_type, flag_reason))
-        self.conn.commit()
+        self._update_flag_counts({agent_type: 1})
+        self.backend.commit(self.conn)
         self.close()
         print(f"🚩 Flagged transaction ID {transaction_id} - Reason: {flag_reason}")
 
+    def flag_cases(self, records):
+        """Flag many transactions in one transaction.
+
+        `records` is an iterable of (transaction_id, agent_type, flag_reason).
+        """
+        records = [(int(tid), agent, reason) for tid, agent, reason in records]
+        if not records:
+            return 0
+        self.connect()
+        self.conn.executemany('''
+            INSERT INTO flagged_cases (transaction_id, agent_type, flag_reason)
+            VALUES (?, ?, ?)
+        ''', records)
+        self._update_flag_counts(pd.Series([agent for _, agent, _ in records]).value_counts().to_dict())
+        self.backend.commit(self.conn)
+        self.close()
+        print(f"🚩 Flagged {len(records)} transactions.")
+        return len(records)
+
     def get_flagged_cases(self) -> pd.DataFrame:
         """Retrieve all flagged cases as a DataFrame."""
         self.connect()
-        cursor = self.conn.cursor()
-        cursor.execute('''
+        df = self.backend.read_frame(self.conn, '''
             SELECT fc.id AS flag_id, fc.transaction_id, fc.agent_type, fc.flag_reason, fc.timestamp,
-                   t.step, t.type, t.amount, t.nameOrig, t.nameDest, t.isFraud, t.isFlaggedFraud
+                   t.step, t.type, t.amount, ao.name AS nameOrig, ad.name AS nameDest,
+                   t.isFraud, t.isFlaggedFraud, t.origId, t.destId
             FROM flagged_cases fc
             JOIN transactions t ON fc.transaction_id = t.id
+            LEFT JOIN accounts ao ON ao.id = t.origId
+            LEFT JOIN accounts ad ON ad.id = t.destId
+            ORDER BY fc.id
         ''')
-        rows = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        df = pd.DataFrame(rows, columns=columns)
         df = df.reset_index(drop=True)  # Ensure a clean RangeIndex
         self.close()
         return df
 
+    # ------------------------------------------------------------------
+    # Analytical queries pushed down into the storage engine
+    # ------------------------------------------------------------------
+    def query_frame(self, sql: str, params=()) -> pd.DataFrame:
+        """Run a read-only query and return a DataFrame."""
+        self.connect()
+        df = self.backend.read_frame(self.conn, sql, params)
+        self.close()
+        return df
+
+    def query_arrow(self, sql: str, params=()):
+        """Run a query and return a pyarrow.Table (zero-copy on the DuckDB backend)."""
+        self.connect()
+        table = self.backend.read_arrow(self.conn, sql, params)
+        self.close()
+        return table
+
+    def query_numpy(self, sql: str, params=()) -> dict:
+        """Run a query and return a dict of NumPy arrays keyed by column."""
+        self.connect()
+        arrays = self.backend.read_numpy(self.conn, sql, params)
+        self.close()
+        return arrays
+
+    def account_aggregates(self, by: str = "origId", where: str = None, params=(),
+                           min_transactions: int = None) -> pd.DataFrame:
+        """Per-account aggregates computed inside the engine.
+
+        `by` is "origId" (senders) or "destId" (receivers); `where` is an
+        optional rule filter on transactions (e.g. "amount < ?") with its
+        `params`; accounts with fewer than `min_transactions` rows are dropped.
+        """
+        if by not in ("origId", "destId"):
+            raise ValueError("by must be 'origId' or 'destId'")
+        other = "destId" if by == "origId" else "origId"
+        sql = f'''
+            SELECT {by} AS account_id, COUNT(*) AS n, SUM(amount) AS amount_sum, MAX(amount) AS amount_max,
+                   MIN(id) AS first_id, MIN(step) AS first_step, MAX(step) AS last_step,
+                   COUNT(DISTINCT {other}) AS n_counterparties
+            FROM transactions
+            {f"WHERE {where}" if where else ""}
+            GROUP BY {by}
+        '''
+        params = list(params)
+        if min_transactions is not None:
+            sql += " HAVING COUNT(*) >= ?"
+            params.append(int(min_transactions))
+        return self.query_frame(sql, params)
+
+    def step_window_counts(self, window: int = 24, where: str = None, params=()) -> pd.DataFrame:
+        """Transaction counts and totals per `window`-step bucket and type."""
+        return self.query_frame(f'''
+            SELECT step - (step % {int(window)}) AS window_start, type,
+                   COUNT(*) AS n, SUM(amount) AS amount_sum, SUM(isFraud) AS n_fraud
+            FROM transactions
+            {f"WHERE {where}" if where else ""}
+            GROUP BY window_start, type
+            ORDER BY window_start, type
+        ''', params)
+
+    def select_transaction_ids(self, where: str, params=()):
+        """Ids of transactions matching a rule filter, evaluated in the engine."""
+        return self.query_numpy(f"SELECT id FROM transactions WHERE {where}", params)['id']
+
+    # ------------------------------------------------------------------
+    # Evidence queries (set-based, one round trip per question for a whole batch)
+    # ------------------------------------------------------------------
+    def _load_temp_table(self, name: str, columns: str, rows):
+        """Create and fill a TEMP table on the open connection."""
+        self.backend.load_temp_table(self.conn, name, columns, rows)
+
+    def get_account_context(self, account_ids, top_counterparties: int = 3) -> dict:
+        """Whole-history context for a batch of accounts.
+
+        Returns a dict of DataFrames: 'sent' and 'received' (per-account totals,
+        distinct counterparties and balance drains), 'flags' (flagged
+        transactions sent by each account) and 'counterparties' (top
+        destinations per account, names decoded).
+        """
+        self.connect()
+        self._load_temp_table("evidence_accounts", "account_id INTEGER PRIMARY KEY",
+                              [(int(a),) for a in set(account_ids)])
+        columns = set(self.backend.table_columns(self.conn, 'transactions'))
+        drain = "SUM(CASE WHEN t.oldbalanceOrg > 0 AND t.newbalanceOrig = 0 THEN 1 ELSE 0 END)" \
+            if {'oldbalanceOrg', 'newbalanceOrig'} <= columns else "NULL"
+
+        sent = self.backend.read_frame(self.conn, f'''
+            SELECT t.origId AS account_id, COUNT(*) AS n_sent, SUM(t.amount) AS amount_sent,
+                   COUNT(DISTINCT t.destId) AS n_recipients, {drain} AS n_drains
+            FROM evidence_accounts a JOIN transactions t ON t.origId = a.account_id
+            GROUP BY t.origId
+        ''')
+        received = self.backend.read_frame(self.conn, '''
+            SELECT t.destId AS account_id, COUNT(*) AS n_received, SUM(t.amount) AS amount_received,
+                   COUNT(DISTINCT t.origId) AS n_senders
+            FROM evidence_accounts a JOIN transactions t ON t.destId = a.account_id
+            GROUP BY t.destId
+        ''')
+        flags = self.backend.read_frame(self.conn, '''
+            SELECT t.origId AS account_id, COUNT(DISTINCT fc.transaction_id) AS n_flagged
+            FROM evidence_accounts a
+            JOIN transactions t ON t.origId = a.account_id
+            JOIN flagged_cases fc ON fc.transaction_id = t.id
+            GROUP BY t.origId
+        ''')
+        counterparties = self.backend.read_frame(self.conn, '''
+            SELECT t.origId AS account_id, acc.name AS counterparty, COUNT(*) AS n, SUM(t.amount) AS amount
+            FROM evidence_accounts a
+            JOIN transactions t ON t.origId = a.account_id
+            LEFT JOIN accounts acc ON acc.id = t.destId
+            GROUP BY t.origId, t.destId, acc.name
+        ''')
+        self.close()
+
+        counterparties = counterparties.sort_values(['account_id', 'amount'], ascending=[True, False]) \
+            .groupby('account_id').head(top_counterparties)
+        return {'sent': sent, 'received': received, 'flags': flags, 'counterparties': counterparties}
+
+    def get_prior_activity(self, cases) -> pd.DataFrame:
+        """Transfers each case's sender made before the flagged transaction.
+
+        `cases` is an iterable of (transaction_id, account_id, step).
+        """
+        self.connect()
+        self._load_temp_table("evidence_cases", "transaction_id INTEGER, account_id INTEGER, step INTEGER",
+                              [(int(t), int(a), int(s)) for t, a, s in cases])
+        df = self.backend.read_frame(self.conn, '''
+            SELECT c.transaction_id, COUNT(t.id) AS n_prior, COALESCE(SUM(t.amount), 0) AS amount_prior,
+                   MIN(t.step) AS first_step
+            FROM evidence_cases c
+            LEFT JOIN transactions t
+                   ON t.origId = c.account_id AND t.step <= c.step AND t.id != c.transaction_id
+            GROUP BY c.transaction_id
+        ''')
+        self.close()
+        return df
+
 # Example usage
 if __name__ == "__main__":
     from utils.data_loader import load_paysim_data
@@ -1,13 +1,17 @@
 
 # aml_investigation_platform/run_all.py
+import os
 import pandas as pd
 from db.sqlite_db import AMLDatabase
 from agents.transaction_analysis import TransactionAnalysisAgent
 from agents.anomaly_detection import AnomalyDetectionAgent
 from agents.investigation import InvestigationAgent
-from utils.data_loader import load_paysim_data
+from utils.data_loader import load_paysim_data, iter_paysim_chunks, CHUNK_SIZE
 from agents.regulatory_reporting import RegulatoryReportingAgent
 
+# Read OUT_OF_CORE flag from environment—process the full dataset in chunks
+OUT_OF_CORE = os.getenv("OUT_OF_CORE", "False").lower() in ("true", "1", "yes")
+
 def run_aml_platform():
     print("📈 Starting AML Investigation Platform...")
     db = AMLDatabase()
@@ -22,7 +26,7 @@ def run_aml_platform():
     # Run agents
     print("🧠 Running Transaction Analysis Agent...")
     transaction_agent = TransactionAnalysisAgent()
-    transaction_agent.analyze(df)
+    transaction_agent.analyze()  # Whole database, via the persisted graph snapshot
 
     print("🧠 Running Anomaly Detection Agent...")
     anomaly_agent = AnomalyDetectionAgent()
@@ -39,7 +43,30 @@ def run_aml_platform():
     print("✅ AML Platform workflow completed!")
     return investigation_reports
 
+def run_aml_platform_out_of_core(chunksize=CHUNK_SIZE):
+    """Run the workflow over the full dataset without holding it in memory."""
+    print("📈 Starting AML Investigation Platform (out-of-core mode)...")
+    db = AMLDatabase()
+
+    print("📥 Streaming transaction data into the database...")
+    db.ingest_chunks(iter_paysim_chunks(chunksize=chunksize))
+
+    print("🧠 Running Transaction Analysis Agent...")
+    TransactionAnalysisAgent().analyze_out_of_core(chunksize)
+
+    print("🧠 Running Anomaly Detection Agent...")
+    AnomalyDetectionAgent().analyze_out_of_core(chunksize)
+
+    print("🕵️ Running Investigation Agent...")
+    investigation_reports = InvestigationAgent().investigate()
+
+    print("📤 Running Regulatory Reporting Agent...")
+    RegulatoryReportingAgent().generate_reports()
+
+    print("✅ AML Platform workflow completed!")
+    return investigation_reports
+
 if __name__ == "__main__":
-    reports = run_aml_platform()
+    reports = run_aml_platform_out_of_core() if OUT_OF_CORE else run_aml_platform()
     for tid, report in reports.items():
         print(f"\n📄 SAR Report for Transaction ID {tid}:\n{report}")
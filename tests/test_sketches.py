@@ -0,0 +1,55 @@
+import numpy as np
+from utils.sketches import CountMinSketch, VelocityMonitor
+
+
+def make_stream(n_background=200_000, n_heavy=200, min_count=5, seed=0):
+    """Mostly one-off senders plus `n_heavy` senders at exactly `min_count` and a few just below it."""
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 10 ** 9, n_background)
+    heavy = np.repeat(np.arange(n_heavy) + 2 * 10 ** 9, min_count)
+    near_miss = np.repeat(np.arange(n_heavy) + 3 * 10 ** 9, min_count - 1)
+    senders = np.concatenate([background, heavy, near_miss])
+    rng.shuffle(senders)
+    return senders
+
+
+def feed(monitor, senders, chunksize=50_000):
+    for start in range(0, len(senders), chunksize):
+        chunk = senders[start:start + chunksize]
+        monitor.update(chunk, chunk + 1, np.full(len(chunk), start // chunksize))
+
+
+def test_count_min_never_underestimates():
+    rng = np.random.default_rng(1)
+    ids = rng.integers(0, 5_000, 100_000)
+    for conservative in (False, True):
+        sketch = CountMinSketch(width=2 ** 10, depth=4, conservative=conservative)
+        for start in range(0, len(ids), 10_000):
+            sketch.add(ids[start:start + 10_000])
+        unique, counts = np.unique(ids, return_counts=True)
+        assert (sketch.estimate(unique) >= counts).all()
+
+
+def test_velocity_prefilter_has_no_false_negatives():
+    senders = make_stream()
+    monitor = VelocityMonitor(min_count=5, expected_total=len(senders))
+    feed(monitor, senders)
+    unique, counts = np.unique(senders, return_counts=True)
+    assert np.isin(unique[counts >= 5], monitor.candidates).all()
+
+
+def test_velocity_prefilter_is_selective():
+    senders = make_stream()
+    monitor = VelocityMonitor(min_count=5, expected_total=len(senders))
+    feed(monitor, senders)
+    unique, counts = np.unique(senders, return_counts=True)
+    n_true = int((counts >= 5).sum())
+    # Almost every sender is a one-off; only a handful of false positives may pass
+    assert len(monitor.candidates) <= n_true + len(unique) // 1000
+
+
+def test_candidate_set_is_capped():
+    senders = make_stream()
+    monitor = VelocityMonitor(min_count=1, expected_total=len(senders), max_candidates=1_000)
+    feed(monitor, senders)
+    assert monitor.candidates is None
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from utils.temporal_graph import TemporalGraph
+
+
+def random_graph(seed, n_accounts=8, n_transactions=40, n_steps=10):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'id': np.arange(n_transactions) + 1,
+        'step': rng.integers(1, n_steps + 1, n_transactions),
+        'amount': rng.uniform(1, 1000, n_transactions),
+        'nameOrig': [f"A{i}" for i in rng.integers(0, n_accounts, n_transactions)],
+        'nameDest': [f"A{i}" for i in rng.integers(0, n_accounts, n_transactions)],
+    })
+    return df, TemporalGraph.from_dataframe(df)
+
+
+def brute_force_arrival(df, source, target, max_hops, start_step=None, end_step=None):
+    """(earliest arrival step, fewest hops at that step) over all time-respecting walks, or None."""
+    rows = list(df[['nameOrig', 'nameDest', 'step']].itertuples(index=False))
+    best = None
+    stack = [(source, start_step, 0)]
+    while stack:
+        node, time, hops = stack.pop()
+        if hops == max_hops:
+            continue
+        for orig, dest, step in rows:
+            if orig != node or dest == source or (time is not None and step < time) \
+                    or (end_step is not None and step > end_step):
+                continue
+            if dest == target and (best is None or (step, hops + 1) < best):
+                best = (step, hops + 1)
+            stack.append((dest, step, hops + 1))
+    return best
+
+
+def check_path(df, path, source, target, max_hops, start_step=None, end_step=None):
+    """Validate a returned path and return its (arrival step, hops)."""
+    rows = df.set_index('id').loc[path]
+    assert 1 <= len(path) <= max_hops
+    assert rows['nameOrig'].iloc[0] == source and rows['nameDest'].iloc[-1] == target
+    assert (rows['nameDest'].to_numpy()[:-1] == rows['nameOrig'].to_numpy()[1:]).all()
+    assert (np.diff(rows['step'].to_numpy()) >= 0).all()
+    if start_step is not None:
+        assert rows['step'].iloc[0] >= start_step
+    if end_step is not None:
+        assert rows['step'].iloc[-1] <= end_step
+    return int(rows['step'].iloc[-1]), len(path)
+
+
+def test_time_respecting_path_matches_brute_force():
+    for seed in range(300):
+        df, graph = random_graph(seed)
+        for source, target in (("A0", "A3"), ("A1", "A5")):
+            if graph.account_id(source) is None or graph.account_id(target) is None:
+                continue
+            for start_step, end_step in ((None, None), (3, 8)):
+                path = graph.time_respecting_path(source, target, start_step, end_step, max_hops=4)
+                expected = brute_force_arrival(df, source, target, 4, start_step, end_step)
+                if expected is None:
+                    assert path is None
+                else:
+                    assert check_path(df, path, source, target, 4, start_step, end_step) == expected
+
+
+def test_find_cycles_matches_networkx():
+    import networkx as nx
+
+    def canonical(cycle):
+        start = cycle.index(min(cycle))
+        return tuple(cycle[start:] + cycle[:start])
+
+    for seed in range(100):
+        _, graph = random_graph(seed, n_accounts=12, n_transactions=120)
+        reference = graph.to_networkx(names=False)
+        for max_length in (1, 2, 3, 4):
+            found = sorted(canonical(cycle) for cycle in graph.find_cycles(max_length))
+            expected = sorted(canonical(cycle) for cycle in nx.simple_cycles(reference, length_bound=max_length))
+            assert found == expected
@@ -0,0 +1,26 @@
+# aml_investigation_platform/utils/accounts.py
+
+import numpy as np
+import pandas as pd
+
+ACCOUNT_COLUMNS = {'nameOrig': 'origId', 'nameDest': 'destId'}
+
+
+def account_codes(df):
+    """Return (orig_codes, dest_codes, names, account_ids) with codes compacted to 0..len(names)-1.
+
+    Frames read from the database carry origId/destId next to the names;
+    codes are then built from those ids and `account_ids` holds the
+    database id of each code. For plain frames `account_ids` is None.
+    """
+    n = len(df)
+    names = pd.concat([df['nameOrig'], df['nameDest']], ignore_index=True)
+    if all(column in df.columns for column in ACCOUNT_COLUMNS.values()):
+        codes, account_ids = pd.factorize(np.concatenate([df['origId'].to_numpy(), df['destId'].to_numpy()]))
+        # Codes number ids by first appearance, so each code's name is the one at its first appearance
+        _, first = np.unique(codes, return_index=True)
+        names = names.to_numpy()[first]
+    else:
+        codes, names = pd.factorize(names)
+        account_ids = None
+    return codes[:n], codes[n:], pd.Index(names, dtype=object), account_ids
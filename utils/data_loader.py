@@ -1,11 +1,20 @@
 import pandas as pd
+import numpy as np
 import os
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib.pyplot as plt
 import seaborn as sns
+from utils import rollups
 
 # Set dataset and output paths
 DATA_PATH = "data/paysim.csv"
 PLOT_DIR = "data"
+CHUNK_SIZE = 500_000
+KDE_SAMPLE_SIZE = 100_000  # Rows the amount KDE is estimated from
+
+# Low-cardinality columns are parsed straight into categoricals (account names are
+# nearly unique, so they stay strings and are mapped to ids by the database on insert)
+CSV_DTYPES = {'type': 'category'}
 
 def load_paysim_data(data_path=DATA_PATH):
     """Load and clean the PaySim dataset."""
@@ -13,7 +22,7 @@ def load_paysim_data(data_path=DATA_PATH):
         raise FileNotFoundError(f"❌ Dataset not found at {data_path}. Please place it in the 'data/' folder.")
 
     print("📥 Loading dataset...")
-    df = pd.read_csv(data_path)
+    df = pd.read_csv(data_path, dtype=CSV_DTYPES)
 
     # Check for missing values
     print("\n🔍 Missing values in each column:")
@@ -39,28 +48,133 @@ def load_paysim_data(data_path=DATA_PATH):
 
     return df
 
-def generate_plots(df, plot_dir=PLOT_DIR):
-    """Generate and save EDA plots."""
-    if not os.path.exists(plot_dir):
-        os.makedirs(plot_dir)
+def iter_paysim_chunks(data_path=DATA_PATH, chunksize=CHUNK_SIZE):
+    """Stream the PaySim dataset in cleaned chunks with a running 'id' column.
+
+    Duplicates are only dropped within a chunk, so memory stays bounded by
+    `chunksize` rather than the size of the file.
+    """
+    if not os.path.exists(data_path):
+        raise FileNotFoundError(f"❌ Dataset not found at {data_path}. Please place it in the 'data/' folder.")
+
+    print(f"📥 Streaming dataset in chunks of {chunksize} rows...")
+    next_id = 0
+    for chunk in pd.read_csv(data_path, chunksize=chunksize, dtype=CSV_DTYPES):
+        chunk['amount'] = chunk['amount'].astype(float)
+        chunk['isFraud'] = chunk['isFraud'].astype(int)
+        chunk['isFlaggedFraud'] = chunk['isFlaggedFraud'].astype(int)
+        chunk = chunk.drop_duplicates().reset_index(drop=True)
+        chunk.insert(0, 'id', range(next_id, next_id + len(chunk)))
+        next_id += len(chunk)
+        yield chunk
+
+def compute_plot_aggregates(df, chunksize=CHUNK_SIZE, sample_size=KDE_SAMPLE_SIZE, bins=50, random_state=42):
+    """Precompute everything the EDA plots need, without per-row plotting.
+
+    Counts come from a groupby, the amount histogram from `np.histogram` over
+    chunks of the amount column (no filtered copy of the frame), and the KDE
+    from a bounded random sample. The 95th-percentile cutoff is approximated
+    from the fixed-bin amount histogram used by the summary tables and kept
+    within the observed amount range.
+    """
+    type_counts = df.groupby(['type', 'isFraud'], observed=True).size().rename('count').reset_index()
+
+    amounts = df['amount'].to_numpy()
+    chunks = [amounts[start:start + chunksize] for start in range(0, len(amounts), chunksize)]
+    amount_hist = sum(rollups.amount_histogram(chunk) for chunk in chunks)
+    cutoff = rollups.quantiles_from_histogram(amount_hist, [0.95])[0]
+
+    # Interpolating inside a log bin can land outside the data (e.g. amounts bunched in one bin)
+    low = float(amounts.min()) if len(amounts) else 0.0
+    high = float(amounts.max()) if len(amounts) else 1.0
+    if not low < cutoff <= high:
+        cutoff = high
+    if cutoff <= low:
+        cutoff = low + 1.0  # All amounts equal: give the single value a unit-wide range
 
-    # Plot 1: Transaction Types by Fraud Status
+    edges = np.linspace(low, cutoff, bins + 1)
+    counts = np.zeros(bins, dtype=np.int64)
+    for chunk in chunks:
+        counts += np.histogram(chunk[chunk <= cutoff], bins=edges)[0]
+
+    # KDE on a bounded sample, scaled to histogram counts
+    rng = np.random.default_rng(random_state)
+    sample = amounts[rng.choice(len(amounts), size=min(sample_size, len(amounts)), replace=False)]
+    grid = np.linspace(edges[0], edges[-1], 200)
+    density = gaussian_kde(sample[sample <= cutoff], grid)
+    kde = density * counts.sum() * (edges[1] - edges[0])
+
+    return {
+        'type_counts': type_counts,
+        'amount_edges': edges,
+        'amount_counts': counts,
+        'kde_grid': grid,
+        'kde': kde,
+    }
+
+def gaussian_kde(sample, grid, block=20):
+    """Gaussian kernel density of `sample` at `grid` points (Scott's rule bandwidth)."""
+    if len(sample) < 2 or sample.std() == 0:
+        return np.zeros(len(grid))
+    bandwidth = sample.std(ddof=1) * len(sample) ** (-1 / 5)
+    density = np.empty(len(grid))
+    # Evaluate a few grid points at a time to bound the (grid x sample) temporary
+    for start in range(0, len(grid), block):
+        z = (grid[start:start + block, None] - sample[None, :]) / bandwidth
+        density[start:start + block] = np.exp(-0.5 * z ** 2).sum(axis=1)
+    return density / (len(sample) * bandwidth * np.sqrt(2 * np.pi))
+
+def plot_transaction_types(aggregates, path):
+    """Transaction Types by Fraud Status, from precomputed counts."""
     plt.figure(figsize=(10, 6))
-    sns.countplot(x='type', hue='isFraud', data=df, palette='Set2')
+    sns.barplot(x='type', y='count', hue='isFraud', data=aggregates['type_counts'], palette='Set2')
     plt.title("Transaction Types by Fraud Status")
     plt.tight_layout()
-    plt.savefig(os.path.join(plot_dir, "transaction_types.png"))
+    plt.savefig(path)
     plt.close()
 
-    # Plot 2: Amount Distribution below 95th percentile
+def plot_amount_distribution(aggregates, path):
+    """Amount distribution below the 95th percentile, from a precomputed histogram and KDE."""
+    edges = aggregates['amount_edges']
     plt.figure(figsize=(10, 6))
-    sns.histplot(df[df['amount'] < df['amount'].quantile(0.95)]['amount'],
-                 bins=50, kde=True, color='skyblue')
+    plt.bar(edges[:-1], aggregates['amount_counts'], width=np.diff(edges), align='edge',
+            color='skyblue', edgecolor='white', alpha=0.8)
+    plt.plot(aggregates['kde_grid'], aggregates['kde'], color='skyblue')
+    plt.xlabel("amount")
+    plt.ylabel("Count")
     plt.title("Transaction Amount Distribution (Below 95th Percentile)")
     plt.tight_layout()
-    plt.savefig(os.path.join(plot_dir, "amount_distribution.png"))
+    plt.savefig(path)
     plt.close()
 
+# Plot file name -> renderer taking (aggregates, path)
+PLOTS = {
+    "transaction_types.png": plot_transaction_types,
+    "amount_distribution.png": plot_amount_distribution,
+}
+
+def generate_plots(df, plot_dir=PLOT_DIR, workers=None):
+    """Generate and save EDA plots.
+
+    Aggregates are computed once and each plot is rendered from them in its
+    own worker process (`workers=1` renders in this process).
+    """
+    if not os.path.exists(plot_dir):
+        os.makedirs(plot_dir)
+
+    print("📐 Computing plot aggregates...")
+    aggregates = compute_plot_aggregates(df)
+
+    workers = workers or min(len(PLOTS), os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(render, aggregates, os.path.join(plot_dir, name)) for name, render in PLOTS.items()]
+            for future in futures:
+                future.result()
+    else:
+        for name, render in PLOTS.items():
+            render(aggregates, os.path.join(plot_dir, name))
+
     print("✅ Plots saved in 'data/' folder.")
 
 if __name__ == "__main__":
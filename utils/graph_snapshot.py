@@ -0,0 +1,208 @@
+# aml_investigation_platform/utils/graph_snapshot.py
+
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from utils.temporal_graph import TemporalGraph
+
+EDGE_COLUMNS = ['id', 'step', 'type', 'amount', 'origId', 'destId']
+
+
+class GraphSnapshotStore:
+    """Versioned on-disk snapshots of the TemporalGraph.
+
+    Each snapshot is a directory of .npy edge and index arrays that are
+    memory-mapped on load, keyed on the database's data version and tagged
+    with its data identity, so snapshots of another or a recreated database
+    are never reused. When the data only grew by appends since an older
+    snapshot, only the new transactions are read from the database.
+    """
+
+    def __init__(self, root, keep=3):
+        self.root = root
+        self.keep = keep  # Number of snapshot versions kept on disk
+
+    @classmethod
+    def for_database(cls, db, keep=3):
+        """Store kept next to the database file (e.g. db/aml_database.db.snapshots)."""
+        return cls(f"{db.db_path}.snapshots", keep)
+
+    def _path(self, version):
+        return os.path.join(self.root, f"v{version}")
+
+    def read_meta(self, version):
+        with open(os.path.join(self._path(version), "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def versions(self):
+        """Versions with a complete snapshot on disk, oldest first."""
+        if not os.path.exists(self.root):
+            return []
+        versions = []
+        for name in os.listdir(self.root):
+            if name.startswith("v") and name[1:].isdigit() and \
+                    os.path.exists(os.path.join(self.root, name, "meta.json")):
+                versions.append(int(name[1:]))
+        return sorted(versions)
+
+    def save(self, graph, version, base_version, identity):
+        """Write `graph` as the snapshot for `version` of the database with `identity`."""
+        final_path = self._path(version)
+        tmp_path = f"{final_path}.tmp{os.getpid()}"
+        os.makedirs(tmp_path, exist_ok=True)
+
+        for name in TemporalGraph.EDGE_ARRAYS + TemporalGraph.INDEX_ARRAYS:
+            array = getattr(graph, name)
+            if array is not None:
+                np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(array))
+        np.save(os.path.join(tmp_path, "account_names.npy"), graph.encoded_accounts())
+        if graph.account_ids is not None:
+            np.save(os.path.join(tmp_path, "account_ids.npy"), np.asarray(graph.account_ids, dtype=np.int64))
+
+        meta = {
+            "version": version,
+            "base_version": base_version,
+            "identity": identity,
+            "num_nodes": graph.num_nodes,
+            "num_edges": graph.num_edges,
+            "max_transaction_id": int(graph.transaction_id.max()) if graph.num_edges else -1,
+            "types": [str(t) for t in graph.types],
+        }
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        try:
+            os.replace(tmp_path, final_path)
+        except OSError:
+            # Another process published this version first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        print(f"💾 Saved graph snapshot v{version} ({graph.num_edges} edges).")
+        self.prune()
+
+    def load(self, version):
+        """Open a snapshot with all arrays memory-mapped (nothing is read until used)."""
+        path = self._path(version)
+        meta = self.read_meta(version)
+
+        def array(name):
+            file_path = os.path.join(path, f"{name}.npy")
+            return np.load(file_path, mmap_mode="r") if os.path.exists(file_path) else None
+
+        return TemporalGraph(
+            accounts=array("account_names"),
+            src=array("src"),
+            dst=array("dst"),
+            step=array("step"),
+            amount=array("amount"),
+            transaction_id=array("transaction_id"),
+            edge_type=array("edge_type"),
+            types=meta["types"],
+            account_ids=array("account_ids"),
+            index={name: array(name) for name in TemporalGraph.INDEX_ARRAYS},
+        )
+
+    def prune(self):
+        """Delete all but the newest `keep` snapshots."""
+        for version in self.versions()[:-self.keep]:
+            shutil.rmtree(self._path(version), ignore_errors=True)
+
+    def get(self, db):
+        """Return the graph for the database's current data version.
+
+        Loads the matching snapshot, extends an older one from the same base
+        with the appended transactions, or builds and saves a new one.
+        Snapshots whose identity does not match the database are discarded.
+        """
+        version, base_version, identity = db.data_version()
+        versions = []
+        for v in self.versions():
+            if self.read_meta(v).get("identity") == identity:
+                versions.append(v)
+            else:
+                print(f"🧹 Discarding graph snapshot v{v} of a different database.")
+                shutil.rmtree(self._path(v), ignore_errors=True)
+        if version in versions:
+            return self.load(version)
+
+        older = [v for v in versions if v < version and self.read_meta(v)["base_version"] == base_version]
+        if older:
+            previous = max(older)
+            since = self.read_meta(previous)["max_transaction_id"]
+            print(f"🧩 Extending graph snapshot v{previous} with transactions after id {since}...")
+            graph = self.extend(self.load(previous), db, since)
+        else:
+            print("🕰️ Building graph snapshot from the database...")
+            graph = self.build(db)
+
+        self.save(graph, version, base_version, identity)
+        return self.load(version)
+
+    @staticmethod
+    def read_edges(db, since=None):
+        """Read edge columns from the transactions table (only ids > `since` if given)."""
+        where, params = ("id > ?", (int(since),)) if since is not None else (None, ())
+        chunks = list(db.iter_transactions(columns=EDGE_COLUMNS, where=where, params=params))
+        if not chunks:
+            return pd.DataFrame(columns=EDGE_COLUMNS)
+        return pd.concat(chunks, ignore_index=True)
+
+    def build(self, db):
+        """Build a graph of every transaction in the database."""
+        edges = self.read_edges(db)
+        codes, account_ids = pd.factorize(np.concatenate([edges['origId'].to_numpy(), edges['destId'].to_numpy()]))
+        edge_type, types = pd.factorize(edges['type'])
+        n = len(edges)
+        return TemporalGraph(
+            accounts=db.account_names(account_ids),
+            src=codes[:n],
+            dst=codes[n:],
+            step=edges['step'].to_numpy(),
+            amount=edges['amount'].to_numpy(),
+            transaction_id=edges['id'].to_numpy(),
+            edge_type=edge_type,
+            types=list(types),
+            account_ids=account_ids,
+        )
+
+    def extend(self, graph, db, since):
+        """Return `graph` plus the transactions appended after id `since`.
+
+        Only the new transactions are read from the database, but the result
+        is a fresh in-memory graph: all edges are copied out of the memory-mapped
+        snapshot and the adjacency index is re-sorted in full.
+        """
+        edges = self.read_edges(db, since)
+        if edges.empty:
+            return graph
+
+        # Map dictionary ids to node ids, adding nodes for accounts not seen yet
+        known = pd.Index(np.asarray(graph.account_ids))
+        new_ids = np.concatenate([edges['origId'].to_numpy(), edges['destId'].to_numpy()])
+        nodes = known.get_indexer(new_ids)
+        unseen = pd.unique(new_ids[nodes < 0])
+        account_ids = np.concatenate([np.asarray(graph.account_ids), unseen])
+        nodes[nodes < 0] = len(known) + pd.Index(unseen).get_indexer(new_ids[nodes < 0])
+        names = np.concatenate([graph.encoded_accounts(),
+                                np.char.encode(np.asarray(db.account_names(unseen), dtype=str), 'utf-8')])
+
+        # Keep type codes stable, appending types that are new
+        types = list(graph.types)
+        for t in pd.unique(edges['type']):
+            if t not in types:
+                types.append(t)
+        edge_type = pd.Index(types).get_indexer(edges['type'])
+
+        n = len(edges)
+        return TemporalGraph(
+            accounts=names,
+            src=np.concatenate([graph.src, nodes[:n]]),
+            dst=np.concatenate([graph.dst, nodes[n:]]),
+            step=np.concatenate([graph.step, edges['step'].to_numpy()]),
+            amount=np.concatenate([graph.amount, edges['amount'].to_numpy()]),
+            transaction_id=np.concatenate([graph.transaction_id, edges['id'].to_numpy()]),
+            edge_type=np.concatenate([graph.edge_type, edge_type]) if graph.edge_type is not None else None,
+            types=types,
+            account_ids=account_ids,
+        )
@@ -0,0 +1,312 @@
+# aml_investigation_platform/utils/jobs.py
+
+import os
+import json
+import time
+import sqlite3
+import traceback
+import multiprocessing
+
+DB_PATH = "db/aml_database.db"
+POLL_INTERVAL = 1.0  # Seconds an idle worker waits before checking the queue again
+
+# Job statuses
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED_STATUSES = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation was requested."""
+
+
+def check_backend():
+    """Raise if the configured storage backend cannot be shared with worker processes."""
+    from db.backends import BACKENDS, DEFAULT_BACKEND
+
+    backend = BACKENDS.get(DEFAULT_BACKEND)
+    if backend is not None and not backend.multi_process:
+        raise RuntimeError(
+            f"❌ Background jobs are not supported on the '{backend.name}' backend: it locks the database "
+            f"file to one process, so workers and the dashboard cannot use it together. "
+            f"Unset AML_DB_BACKEND (or set it to 'sqlite') to run jobs."
+        )
+
+
+class JobQueue:
+    """SQLite-backed queue of long-running analysis jobs.
+
+    Dashboards submit jobs and poll their status; worker processes started
+    with `start_workers` (or `python -m utils.jobs`) claim and run them.
+    Needs a storage backend that several processes can open at once.
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        check_backend()
+        self.db_path = db_path
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self.create_table()
+
+    def _connect(self):
+        # Autocommit mode; claims use an explicit BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create_table(self):
+        """Create the jobs table."""
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                params TEXT,
+                status TEXT NOT NULL DEFAULT 'queued',
+                progress REAL DEFAULT 0,
+                message TEXT,
+                result TEXT,
+                error TEXT,
+                cancel_requested INTEGER DEFAULT 0,
+                submitted_by TEXT,
+                worker_pid INTEGER,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                started_at DATETIME,
+                finished_at DATETIME
+            )
+        ''')
+        conn.close()
+
+    # ------------------------------------------------------------------
+    # Client side (dashboards)
+    # ------------------------------------------------------------------
+    def submit(self, kind, params=None, submitted_by=None):
+        """Queue a job and return its id."""
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        conn = self._connect()
+        cursor = conn.execute(
+            "INSERT INTO jobs (kind, params, submitted_by, message) VALUES (?, ?, ?, ?)",
+            (kind, json.dumps(params or {}), submitted_by, "Waiting for a worker...")
+        )
+        conn.close()
+        print(f"📨 Queued {kind} job {cursor.lastrowid}")
+        return cursor.lastrowid
+
+    def get(self, job_id):
+        """Return a job as a dict (params/result decoded), or None."""
+        conn = self._connect()
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        conn.close()
+        return None if row is None else _decode(row)
+
+    def list_jobs(self, limit=20, submitted_by=None):
+        """Return the most recent jobs, newest first."""
+        conn = self._connect()
+        if submitted_by is None:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE submitted_by = ? ORDER BY id DESC LIMIT ?", (submitted_by, limit)
+            ).fetchall()
+        conn.close()
+        return [_decode(row) for row in rows]
+
+    def cancel(self, job_id):
+        """Cancel a queued job at once, or ask a running job to stop at its next checkpoint."""
+        conn = self._connect()
+        conn.execute(
+            "UPDATE jobs SET status = ?, message = 'Cancelled before start', finished_at = CURRENT_TIMESTAMP "
+            "WHERE id = ? AND status = ?", (CANCELLED, job_id, QUEUED)
+        )
+        conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+        conn.close()
+
+    # ------------------------------------------------------------------
+    # Worker side
+    # ------------------------------------------------------------------
+    def claim_next(self, worker_pid):
+        """Atomically move the oldest queued job to running and return it."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT id FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (QUEUED,)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker_pid = ?, started_at = CURRENT_TIMESTAMP, message = 'Started' "
+                "WHERE id = ?", (RUNNING, worker_pid, row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return self.get(row["id"])
+
+    def update_progress(self, job_id, progress, message=None, partial_result=None):
+        """Record progress (0..1), a status message and optional partial results."""
+        conn = self._connect()
+        conn.execute(
+            "UPDATE jobs SET progress = ?, message = COALESCE(?, message), result = COALESCE(?, result) "
+            "WHERE id = ?",
+            (progress, message, None if partial_result is None else json.dumps(partial_result), job_id)
+        )
+        conn.close()
+
+    def is_cancel_requested(self, job_id):
+        conn = self._connect()
+        row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        conn.close()
+        return bool(row and row["cancel_requested"])
+
+    def finish(self, job_id, status, message, result=None, error=None):
+        """Mark a job as done, failed or cancelled."""
+        conn = self._connect()
+        conn.execute(
+            "UPDATE jobs SET status = ?, message = ?, result = COALESCE(?, result), error = ?, "
+            "progress = CASE WHEN ? = 'done' THEN 1 ELSE progress END, finished_at = CURRENT_TIMESTAMP "
+            "WHERE id = ?",
+            (status, message, None if result is None else json.dumps(result), error, status, job_id)
+        )
+        conn.close()
+
+    def recover_orphaned_jobs(self):
+        """Fail running jobs whose worker process no longer exists."""
+        conn = self._connect()
+        rows = conn.execute("SELECT id, worker_pid FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+        for row in rows:
+            if not _pid_alive(row["worker_pid"]):
+                conn.execute(
+                    "UPDATE jobs SET status = ?, message = 'Worker exited before finishing', "
+                    "finished_at = CURRENT_TIMESTAMP WHERE id = ?", (FAILED, row["id"])
+                )
+        conn.close()
+
+    def start_workers(self, num_workers=2):
+        """Start daemon worker processes and return them."""
+        self.recover_orphaned_jobs()
+        workers = []
+        for _ in range(num_workers):
+            process = multiprocessing.Process(target=worker_loop, args=(self.db_path,), daemon=True)
+            process.start()
+            workers.append(process)
+        print(f"👷 Started {num_workers} job workers.")
+        return workers
+
+
+class JobContext:
+    """Handle passed to a running job for progress reporting and cancellation checks."""
+
+    def __init__(self, queue, job_id):
+        self.queue = queue
+        self.job_id = job_id
+
+    def progress(self, fraction, message=None, partial_result=None):
+        """Report progress; raises JobCancelled if the job was cancelled meanwhile."""
+        self.queue.update_progress(self.job_id, fraction, message, partial_result)
+        if self.queue.is_cancel_requested(self.job_id):
+            raise JobCancelled()
+
+
+def _decode(row):
+    job = dict(row)
+    job["params"] = json.loads(job["params"]) if job["params"] else {}
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def run_analysis_job(ctx, params):
+    """Run the detection agents over the transactions in the DB (optionally filtered).
+
+    Anomaly scores and their rollups are shared by every dashboard session,
+    so only unfiltered runs replace them; filtered runs only add flags.
+    """
+    from db.sqlite_db import AMLDatabase
+    from agents.transaction_analysis import TransactionAnalysisAgent
+    from agents.anomaly_detection import AnomalyDetectionAgent
+
+    db = AMLDatabase()
+    ctx.progress(0.05, "Loading transactions...")
+    df = db.get_transactions(params.get("min_step"), params.get("max_step"), params.get("txn_type"))
+    result = {"transactions": len(df)}
+
+    ctx.progress(0.15, "Running Transaction Analysis...", result)
+    filtered = any(params.get(k) is not None for k in ("min_step", "max_step", "txn_type"))
+    # Unfiltered runs reuse the persisted graph snapshot instead of rebuilding it
+    TransactionAnalysisAgent().analyze(df if filtered else None)
+    result["flagged_cases"] = len(db.get_flagged_cases())
+
+    ctx.progress(0.5, "Running Anomaly Detection...", result)
+    df_with_anomalies = AnomalyDetectionAgent().analyze(df, save_scores=not filtered)
+    result["scores_saved"] = not filtered
+    result["anomalies"] = int(df_with_anomalies["is_anomaly"].sum())
+    result["flagged_cases"] = len(db.get_flagged_cases())
+
+    if params.get("generate_reports"):
+        ctx.progress(0.8, "Generating SAR reports...", result)
+        result.update(run_report_job(ctx, params))
+
+    return result
+
+
+def run_report_job(ctx, params):
+    """Generate SARs for the flagged cases and (up to `max_emails`) deliver them."""
+    from agents.investigation import InvestigationAgent
+    from agents.regulatory_reporting import RegulatoryReportingAgent
+
+    reports = InvestigationAgent().investigate()
+    # Report texts are returned with the job so dashboards can offer them for download
+    result = {"reports": len(reports), "sar_reports": {str(tid): report for tid, report in reports.items()}}
+    if params.get("max_emails", 10):
+        ctx.progress(0.9, "Delivering SAR reports...", {"reports": len(reports)})
+        RegulatoryReportingAgent().generate_reports(max_emails=params.get("max_emails", 10))
+    return result
+
+
+# Job kinds that can be submitted, mapped to the function that runs them
+JOB_HANDLERS = {
+    "analysis": run_analysis_job,
+    "reports": run_report_job,
+}
+
+
+def worker_loop(db_path=DB_PATH, poll_interval=POLL_INTERVAL):
+    """Claim and run jobs forever."""
+    queue = JobQueue(db_path)
+    pid = os.getpid()
+    while True:
+        job = queue.claim_next(pid)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        print(f"⚙️ Worker {pid} running {job['kind']} job {job['id']}")
+        try:
+            result = JOB_HANDLERS[job["kind"]](JobContext(queue, job["id"]), job["params"])
+            queue.finish(job["id"], DONE, "✅ Completed", result=result)
+        except JobCancelled:
+            queue.finish(job["id"], CANCELLED, "Cancelled")
+        except Exception as e:
+            queue.finish(job["id"], FAILED, f"❌ {e}", error=traceback.format_exc())
+
+
+if __name__ == "__main__":
+    num_workers = int(os.getenv("JOB_WORKERS", "2"))
+    workers = JobQueue().start_workers(num_workers)
+    for process in workers:
+        process.join()
@@ -0,0 +1,83 @@
+# aml_investigation_platform/utils/rollups.py
+
+import numpy as np
+import pandas as pd
+
+# Fixed bin edges keep every rollup additive across chunks and ingests.
+# Amounts: 0 plus 20 log-spaced bins per decade from 1 to 1e10 (~12% wide each).
+AMOUNT_BINS = np.concatenate([[0.0], np.logspace(0, 10, 201)])
+# IsolationForest.score_samples returns values in [-1, 0]
+SCORE_BINS = np.linspace(-1.0, 0.0, 101)
+# Coarser grid for the Anomaly page's density scatter
+DENSITY_AMOUNT_BINS = np.concatenate([[0.0], np.logspace(0, 10, 61)])
+DENSITY_SCORE_BINS = np.linspace(-1.0, 0.0, 51)
+
+
+def _bin_index(values, edges):
+    """Index of the bin each value falls in, clipped to the outer bins."""
+    return np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+
+
+def transaction_counts(df):
+    """Per (step, type) transaction count, amount total and fraud count."""
+    grouped = df.groupby(['step', 'type'], observed=True)
+    counts = grouped.agg(n=('amount', 'size'), amount_sum=('amount', 'sum'), n_fraud=('isFraud', 'sum'))
+    return counts.reset_index()
+
+
+def amount_histogram(amounts):
+    """Counts of amounts per AMOUNT_BINS bin."""
+    return np.bincount(_bin_index(np.asarray(amounts, dtype=float), AMOUNT_BINS),
+                       minlength=len(AMOUNT_BINS) - 1)
+
+
+def quantiles_from_histogram(counts, quantiles, edges=AMOUNT_BINS):
+    """Approximate quantiles by interpolating inside the bin that holds each rank."""
+    counts = np.asarray(counts, dtype=float)
+    total = counts.sum()
+    if total == 0:
+        return [np.nan for _ in quantiles]
+    cumulative = np.cumsum(counts)
+    values = []
+    for q in quantiles:
+        rank = q * total
+        i = min(int(np.searchsorted(cumulative, rank, side='left')), len(counts) - 1)
+        below = cumulative[i] - counts[i]
+        fraction = 0.0 if counts[i] == 0 else (rank - below) / counts[i]
+        values.append(edges[i] + fraction * (edges[i + 1] - edges[i]))
+    return values
+
+
+def score_histogram(scores, is_anomaly):
+    """Counts of anomaly scores per SCORE_BINS bin, overall and for anomalies only."""
+    bins = _bin_index(np.asarray(scores, dtype=float), SCORE_BINS)
+    size = len(SCORE_BINS) - 1
+    anomalous = np.asarray(is_anomaly).astype(bool)
+    return np.bincount(bins, minlength=size), np.bincount(bins[anomalous], minlength=size)
+
+
+def anomaly_density(amounts, scores, is_anomaly):
+    """2-D counts over (amount, score) bins, overall and for anomalies only."""
+    a = _bin_index(np.asarray(amounts, dtype=float), DENSITY_AMOUNT_BINS)
+    s = _bin_index(np.asarray(scores, dtype=float), DENSITY_SCORE_BINS)
+    shape = (len(DENSITY_AMOUNT_BINS) - 1, len(DENSITY_SCORE_BINS) - 1)
+    flat = a * shape[1] + s
+    anomalous = np.asarray(is_anomaly).astype(bool)
+    size = shape[0] * shape[1]
+    return (np.bincount(flat, minlength=size).reshape(shape),
+            np.bincount(flat[anomalous], minlength=size).reshape(shape))
+
+
+def density_frame(counts, anomaly_counts):
+    """Non-empty density cells as rows with bin-centre coordinates, ready to plot."""
+    a, s = np.nonzero(counts)
+    amount_centres = np.sqrt(np.maximum(DENSITY_AMOUNT_BINS[:-1], 0.5) * DENSITY_AMOUNT_BINS[1:])
+    score_centres = (DENSITY_SCORE_BINS[:-1] + DENSITY_SCORE_BINS[1:]) / 2
+    return pd.DataFrame({
+        'amount_bin': a,
+        'score_bin': s,
+        'amount': amount_centres[a],
+        'score': score_centres[s],
+        'n': counts[a, s],
+        'n_anomaly': anomaly_counts[a, s],
+    })
@@ -0,0 +1,282 @@
+# aml_investigation_platform/utils/sketches.py
+
+import numpy as np
+import pandas as pd
+
+# Odd 64-bit constants for the splitmix64 finaliser
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+# Bounds on the width of a count-min sketch sized from the expected total
+MIN_WIDTH = 2 ** 12
+MAX_WIDTH = 2 ** 22
+
+
+def sketch_width(expected_total, min_count):
+    """Count-min width for thresholding at `min_count` over `expected_total` additions.
+
+    Keeps the mean load per cell at a quarter of `min_count`, so an id with
+    a single addition rarely collides its way over the threshold in every row.
+    """
+    width = 4 * max(int(expected_total), 1) / max(min_count, 1)
+    return int(min(max(2 ** int(np.ceil(np.log2(width))), MIN_WIDTH), MAX_WIDTH))
+
+
+def hash_ids(ids, seed=0):
+    """64-bit hashes of integer account ids (splitmix64, vectorized)."""
+    with np.errstate(over='ignore'):
+        h = np.asarray(ids).astype(np.uint64) + _GOLDEN * np.uint64(seed + 1)
+        h = (h ^ (h >> np.uint64(30))) * _MIX1
+        h = (h ^ (h >> np.uint64(27))) * _MIX2
+        return h ^ (h >> np.uint64(31))
+
+
+def _bit_length(values):
+    """Number of significant bits of each uint64 value (exact, unlike float log2)."""
+    values = values.copy()
+    length = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        big = values >= (np.uint64(1) << np.uint64(shift))
+        length[big] += shift
+        values[big] >>= np.uint64(shift)
+    return length + (values > 0)
+
+
+class CountMinSketch:
+    """Approximate per-id counts in fixed memory (never underestimates).
+
+    With `width` w and `depth` d, estimates exceed the true count by at most
+    2 * total / w with probability 1 - 2^-d. With `conservative=True` each
+    add only raises the cells that hold the id's current minimum, which
+    keeps collision noise far below that bound.
+    """
+
+    def __init__(self, width=2 ** 16, depth=4, conservative=False):
+        self.width = width
+        self.depth = depth
+        self.conservative = conservative
+        self.table = np.zeros((depth, width), dtype=np.int32)
+        self.total = 0
+
+    def _columns(self, ids):
+        return [(hash_ids(ids, seed=row) % np.uint64(self.width)).astype(np.int64) for row in range(self.depth)]
+
+    def add(self, ids, counts=1):
+        """Add `counts` (scalar or per-id) for each id."""
+        ids = np.asarray(ids)
+        counts = np.broadcast_to(np.asarray(counts, dtype=np.int32), ids.shape)
+        self.total += int(counts.sum(dtype=np.int64))
+        if self.conservative:
+            # Aggregate the batch per id, then raise each cell to at least the new estimate
+            ids, inverse = np.unique(ids, return_inverse=True)
+            counts = np.bincount(inverse, weights=counts, minlength=len(ids)).astype(np.int32)
+            target = self.estimate(ids) + counts
+            for row, columns in enumerate(self._columns(ids)):
+                np.maximum.at(self.table[row], columns, target)
+            return
+        for row, columns in enumerate(self._columns(ids)):
+            np.add.at(self.table[row], columns, counts)
+
+    def estimate(self, ids):
+        """Estimated count of each id."""
+        ids = np.asarray(ids)
+        if len(ids) == 0:
+            return np.zeros(0, dtype=np.int32)
+        return np.min([self.table[row][columns] for row, columns in enumerate(self._columns(ids))], axis=0)
+
+    def merge(self, other):
+        """Add another sketch of the same shape into this one."""
+        self.table += other.table
+        self.total += other.total
+
+
+class SlidingCountMinSketch:
+    """Count-min sketches per step over the latest `window` steps.
+
+    Rows older than the window (relative to the newest step seen) are
+    dropped, so memory is bounded by `window` sketches.
+    """
+
+    def __init__(self, window=24, width=2 ** 14, depth=4):
+        self.window = window
+        self.width = width
+        self.depth = depth
+        self.buckets = {}  # step -> CountMinSketch
+        self.latest_step = None
+
+    def add(self, ids, steps):
+        ids, steps = np.asarray(ids), np.asarray(steps)
+        if len(steps) == 0:
+            return
+        newest = int(steps.max())
+        self.latest_step = newest if self.latest_step is None else max(self.latest_step, newest)
+        horizon = self.latest_step - self.window
+        for step in np.unique(steps[steps > horizon]):
+            if step not in self.buckets:
+                self.buckets[step] = CountMinSketch(self.width, self.depth)
+            self.buckets[step].add(ids[steps == step])
+        for step in [s for s in self.buckets if s <= horizon]:
+            del self.buckets[step]
+
+    def estimate(self, ids, end_step=None):
+        """Estimated count of each id over the `window` steps ending at `end_step` (default: newest)."""
+        ids = np.asarray(ids)
+        end_step = self.latest_step if end_step is None else end_step
+        total = np.zeros(len(ids), dtype=np.int64)
+        if end_step is None:
+            return total
+        for step, sketch in self.buckets.items():
+            if end_step - self.window < step <= end_step:
+                total += sketch.estimate(ids)
+        return total
+
+
+class SpaceSaving:
+    """Top-k heavy hitters (Space-Saving) updated in vectorized batches.
+
+    Each batch is counted exactly and merged into the summary; ids that were
+    not tracked enter with the summary's minimum count as their error bound.
+    Any id whose true count exceeds `min_count` is guaranteed to be tracked.
+    """
+
+    def __init__(self, k=1000):
+        self.k = k
+        self.counters = pd.DataFrame({'count': pd.Series(dtype=np.int64), 'error': pd.Series(dtype=np.int64)})
+
+    @property
+    def min_count(self):
+        """Upper bound on the count of any id that is not tracked."""
+        return int(self.counters['count'].min()) if len(self.counters) >= self.k else 0
+
+    def update(self, ids, counts=None):
+        ids = pd.Series(np.asarray(ids))
+        batch = ids.value_counts() if counts is None else pd.Series(np.asarray(counts)).groupby(ids).sum()
+        if batch.empty:
+            return
+        offset = self.min_count
+        merged = pd.DataFrame({'count': batch.astype(np.int64) + offset, 'error': np.int64(offset)})
+        tracked = merged.index.intersection(self.counters.index)
+        merged.loc[tracked, 'count'] = batch[tracked] + self.counters.loc[tracked, 'count']
+        merged.loc[tracked, 'error'] = self.counters.loc[tracked, 'error']
+        merged = pd.concat([self.counters.drop(tracked), merged])
+        self.counters = merged.nlargest(self.k, 'count')
+
+    def top(self, n=None):
+        """Tracked ids with estimated count and error, largest first."""
+        top = self.counters.sort_values('count', ascending=False)
+        return top if n is None else top.head(n)
+
+
+class HyperLogLog:
+    """Distinct-count estimate in 2^p one-byte registers (~1.04 / sqrt(2^p) relative error)."""
+
+    def __init__(self, p=10):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, ids):
+        self.add_hashes(hash_ids(ids, seed=97))
+
+    def add_hashes(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes & ((np.uint64(1) << np.uint64(64 - self.p)) - np.uint64(1))
+        rank = (64 - self.p - _bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def estimate(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m ** 2 / np.sum(2.0 ** -self.registers.astype(np.float64))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * self.m and zeros:
+            return self.m * np.log(self.m / zeros)  # Linear counting for small cardinalities
+        return float(raw)
+
+
+class VelocityMonitor:
+    """Bounded-memory per-account activity tracking, used as a pre-filter.
+
+    Tracks all-time send counts and sliding-window send/receive counts (count-min),
+    the top senders and receivers (Space-Saving) and, for those tracked
+    accounts only, distinct counterparties (HyperLogLog). Accounts whose
+    estimated send count reaches `min_count` are collected in `candidates`;
+    since count-min never underestimates, no account that truly reaches it
+    is missed, and only the candidates need exact analysis.
+
+    Pass `expected_total` (number of transactions that will be fed) so the
+    all-time sketch is wide enough to stay selective at `min_count`. The
+    candidate array is capped at `max_candidates`; past that the pre-filter
+    gives up (`candidates` becomes None) rather than grow without bound.
+    """
+
+    def __init__(self, window=24, top_k=1000, min_count=None, expected_total=None, width=2 ** 16, depth=4,
+                 window_width=2 ** 14, hll_precision=10, max_candidates=1_000_000):
+        self.min_count = min_count
+        if expected_total is not None and min_count is not None:
+            width = sketch_width(expected_total, min_count)
+        self.sent = CountMinSketch(width, depth, conservative=True)
+        self.window_sent = SlidingCountMinSketch(window, window_width, depth)
+        self.window_received = SlidingCountMinSketch(window, window_width, depth)
+        self.top_senders = SpaceSaving(top_k)
+        self.top_receivers = SpaceSaving(top_k)
+        self.hll_precision = hll_precision
+        self.fan_out = {}  # tracked sender -> HyperLogLog of receivers
+        self.fan_in = {}  # tracked receiver -> HyperLogLog of senders
+        self.max_candidates = max_candidates
+        self.candidates = np.zeros(0, dtype=np.int64)  # Sorted unique ids, or None once over the cap
+
+    def update(self, senders, receivers, steps):
+        """Feed a batch of transactions given as integer account id and step arrays."""
+        senders, receivers, steps = np.asarray(senders), np.asarray(receivers), np.asarray(steps)
+        self.sent.add(senders)
+        self.window_sent.add(senders, steps)
+        self.window_received.add(receivers, steps)
+        self.top_senders.update(senders)
+        self.top_receivers.update(receivers)
+        self._update_fan(self.fan_out, self.top_senders, senders, receivers)
+        self._update_fan(self.fan_in, self.top_receivers, receivers, senders)
+        if self.min_count is not None and self.candidates is not None:
+            unique = np.unique(senders)
+            hits = unique[self.sent.estimate(unique) >= self.min_count].astype(np.int64)
+            self.candidates = np.union1d(self.candidates, hits)
+            if len(self.candidates) > self.max_candidates:
+                print(f"⚠️ Over {self.max_candidates} candidate accounts; velocity pre-filter disabled.")
+                self.candidates = None
+
+    def update_frame(self, chunk):
+        """Feed a transactions chunk (origId/destId, or nameOrig/nameDest)."""
+        self.update(_account_ids(chunk, 'origId', 'nameOrig'), _account_ids(chunk, 'destId', 'nameDest'),
+                    chunk['step'].to_numpy())
+
+    def _update_fan(self, sketches, tracker, accounts, counterparties):
+        tracked = tracker.counters.index
+        for account in [a for a in sketches if a not in tracked]:
+            del sketches[account]  # Evicted from the heavy hitters
+        mask = np.isin(accounts, tracked)
+        if not mask.any():
+            return
+        hashes = hash_ids(counterparties[mask], seed=97)
+        for account, group in pd.Series(hashes).groupby(accounts[mask]):
+            if account not in sketches:
+                sketches[account] = HyperLogLog(self.hll_precision)
+            sketches[account].add_hashes(group.to_numpy())
+
+    def velocity(self, accounts, end_step=None):
+        """Estimated sends and receives of each account in the window ending at `end_step`."""
+        return self.window_sent.estimate(accounts, end_step), self.window_received.estimate(accounts, end_step)
+
+    def report(self, n=10):
+        """Top senders with estimated counts, window velocity and fan-out."""
+        top = self.top_senders.top(n).copy()
+        top['window_sent'] = self.window_sent.estimate(top.index.to_numpy())
+        top['fan_out'] = [round(self.fan_out[a].estimate()) if a in self.fan_out else 0 for a in top.index]
+        return top
+
+
+def _account_ids(chunk, id_column, name_column):
+    """Integer account ids of a chunk: database ids, or hashed names (stable across chunks)."""
+    if id_column in chunk.columns:
+        return chunk[id_column].to_numpy()
+    return pd.util.hash_array(chunk[name_column].to_numpy(dtype=object)).astype(np.int64)
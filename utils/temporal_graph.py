@@ -0,0 +1,378 @@
+# aml_investigation_platform/utils/temporal_graph.py
+
+import numpy as np
+import pandas as pd
+import networkx as nx
+from utils.accounts import account_codes
+
+
+def _offsets(sorted_nodes, num_nodes):
+    """Build CSR offsets so edges of node i live in [offsets[i], offsets[i + 1])."""
+    counts = np.bincount(sorted_nodes, minlength=num_nodes)
+    offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+class TemporalGraph:
+    """Time-indexed transaction graph.
+
+    Edges are kept in flat NumPy arrays. For every account the outgoing and
+    incoming edge lists are sorted by `step` and addressed through offset
+    arrays, so "edges of X between step a and b" is two binary searches.
+    """
+
+    # Arrays that make up the graph (and its on-disk snapshot)
+    EDGE_ARRAYS = ('src', 'dst', 'step', 'amount', 'transaction_id', 'edge_type')
+    INDEX_ARRAYS = ('out_order', 'out_step', 'out_offsets', 'in_order', 'in_step', 'in_offsets')
+
+    def __init__(self, accounts, src, dst, step, amount, transaction_id,
+                 edge_type=None, types=None, account_ids=None, index=None):
+        # Names may be a pd.Index or a (memory-mapped) bytes array decoded on first use
+        self._accounts = accounts
+        self.account_ids = account_ids  # Account-dictionary id of each node, if known
+        self.src = np.asarray(src, dtype=np.int64)
+        self.dst = np.asarray(dst, dtype=np.int64)
+        self.step = np.asarray(step, dtype=np.int64)
+        self.amount = np.asarray(amount, dtype=np.float64)
+        self.transaction_id = np.asarray(transaction_id, dtype=np.int64)
+        self.edge_type = None if edge_type is None else np.asarray(edge_type, dtype=np.int8)
+        self.types = list(types) if types is not None else []
+
+        if index is not None:
+            # Precomputed adjacency (e.g. loaded from a snapshot)
+            for name in self.INDEX_ARRAYS:
+                setattr(self, name, index[name])
+        else:
+            num_nodes = self.num_nodes
+
+            # Outgoing index: edges sorted by (src, step)
+            self.out_order = np.lexsort((self.step, self.src))
+            self.out_step = self.step[self.out_order]
+            self.out_offsets = _offsets(self.src[self.out_order], num_nodes)
+
+            # Incoming index: edges sorted by (dst, step)
+            self.in_order = np.lexsort((self.step, self.dst))
+            self.in_step = self.step[self.in_order]
+            self.in_offsets = _offsets(self.dst[self.in_order], num_nodes)
+
+        self._txn_index = None
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Build the index from a transactions frame (needs id, step, amount, nameOrig, nameDest)."""
+        print("🕰️ Building temporal graph index...")
+        src, dst, accounts, account_ids = account_codes(df)
+        edge_type, types = pd.factorize(df['type']) if 'type' in df.columns else (None, None)
+        return cls(
+            accounts=accounts,
+            src=src,
+            dst=dst,
+            step=df['step'].to_numpy(),
+            amount=df['amount'].to_numpy(),
+            transaction_id=df['id'].to_numpy(),
+            edge_type=edge_type,
+            types=types,
+            account_ids=account_ids,
+        )
+
+    @property
+    def accounts(self):
+        """Account names indexed by node id."""
+        if not isinstance(self._accounts, pd.Index):
+            names = np.asarray(self._accounts)
+            if names.dtype.kind == 'S':
+                names = np.char.decode(names, 'utf-8')
+            self._accounts = pd.Index(names, dtype=object)
+        return self._accounts
+
+    def encoded_accounts(self):
+        """Account names as a fixed-width UTF-8 bytes array (the snapshot format)."""
+        if not isinstance(self._accounts, pd.Index):
+            return np.asarray(self._accounts)
+        return np.char.encode(np.asarray(self._accounts, dtype=str), 'utf-8')
+
+    @property
+    def num_nodes(self):
+        return len(self._accounts)
+
+    @property
+    def num_edges(self):
+        return len(self.src)
+
+    def edges_in_window(self, start_step=None, end_step=None, txn_type=None):
+        """Edge indices within a step range and (optionally) of one transaction type."""
+        mask = np.ones(self.num_edges, dtype=bool)
+        if start_step is not None:
+            mask &= self.step >= start_step
+        if end_step is not None:
+            mask &= self.step <= end_step
+        if txn_type is not None:
+            if txn_type not in self.types:
+                return np.array([], dtype=np.int64)
+            mask &= self.edge_type == self.types.index(txn_type)
+        return np.flatnonzero(mask)
+
+    def to_networkx(self, edges=None, names=True):
+        """Build a networkx DiGraph (amount and type on each edge) over some or all edges.
+
+        Nodes are account names, or internal node ids with `names=False`.
+        """
+        edges = np.arange(self.num_edges) if edges is None else np.asarray(edges, dtype=np.int64)
+        src, dst = self.src[edges], self.dst[edges]
+        if names:
+            src, dst = self.accounts[src], self.accounts[dst]
+        if self.edge_type is not None:
+            types = np.asarray(self.types, dtype=object)[self.edge_type[edges]].tolist()
+        else:
+            types = [None] * len(edges)
+        graph = nx.DiGraph()
+        graph.add_edges_from(
+            (u, v, {'amount': amount, 'type': trans_type})
+            for u, v, amount, trans_type in zip(src.tolist(), dst.tolist(), self.amount[edges].tolist(), types)
+        )
+        return graph
+
+    def account_id(self, name):
+        """Return the internal node id of an account name, or None if unknown."""
+        idx = self.accounts.get_indexer([name])[0]
+        return None if idx < 0 else int(idx)
+
+    def edge_of_transaction(self, transaction_id):
+        """Return the edge index of a transaction id, or None if unknown."""
+        if self._txn_index is None:
+            self._txn_index = pd.Index(self.transaction_id)
+        idx = self._txn_index.get_indexer([transaction_id])[0]
+        return None if idx < 0 else int(idx)
+
+    # ------------------------------------------------------------------
+    # Adjacency lookups
+    # ------------------------------------------------------------------
+    def _out_edges(self, node, start_step=None, end_step=None):
+        """Edge indices leaving `node` with start_step <= step <= end_step, in step order."""
+        lo, hi = self.out_offsets[node], self.out_offsets[node + 1]
+        steps = self.out_step[lo:hi]
+        left = 0 if start_step is None else np.searchsorted(steps, start_step, side='left')
+        right = len(steps) if end_step is None else np.searchsorted(steps, end_step, side='right')
+        return self.out_order[lo + left:lo + right]
+
+    def _in_edges(self, node, start_step=None, end_step=None):
+        """Edge indices entering `node` with start_step <= step <= end_step, in step order."""
+        lo, hi = self.in_offsets[node], self.in_offsets[node + 1]
+        steps = self.in_step[lo:hi]
+        left = 0 if start_step is None else np.searchsorted(steps, start_step, side='left')
+        right = len(steps) if end_step is None else np.searchsorted(steps, end_step, side='right')
+        return self.in_order[lo + left:lo + right]
+
+    def edges_frame(self, edges, **extra_columns):
+        """Render edge indices as a readable DataFrame."""
+        edges = np.asarray(edges, dtype=np.int64)
+        frame = pd.DataFrame({
+            'transaction_id': self.transaction_id[edges],
+            'step': self.step[edges],
+            'nameOrig': self.accounts[self.src[edges]],
+            'nameDest': self.accounts[self.dst[edges]],
+            'amount': self.amount[edges],
+        })
+        for column, values in extra_columns.items():
+            frame[column] = values
+        return frame
+
+    def out_edges(self, account, start_step=None, end_step=None):
+        """Outgoing transactions of `account` within a step window."""
+        node = self.account_id(account)
+        edges = [] if node is None else self._out_edges(node, start_step, end_step)
+        return self.edges_frame(edges)
+
+    def in_edges(self, account, start_step=None, end_step=None):
+        """Incoming transactions of `account` within a step window."""
+        node = self.account_id(account)
+        edges = [] if node is None else self._in_edges(node, start_step, end_step)
+        return self.edges_frame(edges)
+
+    # ------------------------------------------------------------------
+    # Fund tracing
+    # ------------------------------------------------------------------
+    def trace_forward(self, transaction_id, max_hops=3, max_steps=None, max_edges=10000):
+        """Follow funds forward from a transaction along time-respecting edges.
+
+        Each hop only takes edges whose step is >= the step at which money
+        arrived at the account. Returns the reached edges with their hop count.
+        """
+        return self._trace(transaction_id, max_hops, max_steps, max_edges, forward=True)
+
+    def trace_backward(self, transaction_id, max_hops=3, max_steps=None, max_edges=10000):
+        """Follow funds backward from a transaction to where they came from."""
+        return self._trace(transaction_id, max_hops, max_steps, max_edges, forward=False)
+
+    def _trace(self, transaction_id, max_hops, max_steps, max_edges, forward):
+        seed = self.edge_of_transaction(transaction_id)
+        if seed is None:
+            return self.edges_frame([], hop=[])
+
+        seed_step = int(self.step[seed])
+        if forward:
+            bound = None if max_steps is None else seed_step + max_steps
+            frontier = {int(self.dst[seed]): seed_step}
+        else:
+            bound = None if max_steps is None else seed_step - max_steps
+            frontier = {int(self.src[seed]): seed_step}
+
+        seen = {seed}
+        found_edges, found_hops = [seed], [0]
+        for hop in range(1, max_hops + 1):
+            next_frontier = {}
+            for node, time in frontier.items():
+                if forward:
+                    edges = self._out_edges(node, time, bound)
+                    nodes = self.dst[edges]
+                else:
+                    edges = self._in_edges(node, bound, time)
+                    nodes = self.src[edges]
+                for edge, other in zip(edges.tolist(), nodes.tolist()):
+                    if edge in seen:
+                        continue
+                    seen.add(edge)
+                    found_edges.append(edge)
+                    found_hops.append(hop)
+                    edge_step = int(self.step[edge])
+                    # Earliest arrival (latest departure when tracing back) dominates
+                    best = next_frontier.get(other)
+                    if best is None or (edge_step < best if forward else edge_step > best):
+                        next_frontier[other] = edge_step
+                if len(found_edges) >= max_edges:
+                    break
+            if len(found_edges) >= max_edges or not next_frontier:
+                break
+            frontier = next_frontier
+
+        return self.edges_frame(found_edges[:max_edges], hop=found_hops[:max_edges])
+
+    def time_respecting_path(self, source, target, start_step=None, end_step=None, max_hops=6):
+        """Return the transaction ids of an earliest-arrival path source -> target, or None.
+
+        Among paths of at most `max_hops` transfers, the one reaching `target`
+        at the earliest step is returned (fewest hops on ties).
+        """
+        src, dst = self.account_id(source), self.account_id(target)
+        if src is None or dst is None:
+            return None
+
+        # Hop-bounded Bellman-Ford: round k reads the best paths of at most k - 1 hops
+        # and writes to fresh copies, so no path grows twice in one round
+        arrival = {src: start_step}
+        paths = {src: []}
+        frontier = [src]
+        for _ in range(max_hops):
+            next_arrival, next_paths = dict(arrival), dict(paths)
+            for node in frontier:
+                for edge in self._out_edges(node, arrival[node], end_step).tolist():
+                    other = int(self.dst[edge])
+                    edge_step = int(self.step[edge])
+                    if other == src or (other in next_arrival and next_arrival[other] <= edge_step):
+                        continue
+                    next_arrival[other] = edge_step
+                    next_paths[other] = paths[node] + [edge]
+            frontier = [node for node in next_arrival if node not in arrival or next_arrival[node] != arrival[node]]
+            arrival, paths = next_arrival, next_paths
+            if not frontier:
+                break
+        if dst not in paths:
+            return None
+        return [int(self.transaction_id[edge]) for edge in paths[dst]]
+
+    def find_cycles(self, max_length=3, max_cycles=100_000):
+        """Find simple cycles of at most `max_length` accounts from the adjacency arrays.
+
+        Paths are grown level by level as NumPy arrays, each starting at its
+        smallest node so every cycle is found once. Returns lists of node ids
+        in flow order, self-loops included, ignoring edge times.
+        """
+        n = np.int64(self.num_nodes)
+        pairs = np.unique(self.src * n + self.dst)  # Distinct (src, dst) pairs, sorted
+        heads, tails = pairs // n, pairs % n
+        cycles = [[int(node)] for node in heads[heads == tails]]
+
+        def has_edge(u, v):
+            keys = u * n + v
+            idx = np.minimum(np.searchsorted(pairs, keys), max(len(pairs) - 1, 0))
+            return pairs[idx] == keys if len(pairs) else np.zeros(len(keys), dtype=bool)
+
+        # Adjacency of distinct successors (self-loops dropped), as CSR
+        keep = heads != tails
+        heads, tails = heads[keep], tails[keep]
+        offsets = _offsets(heads, self.num_nodes)
+
+        paths = np.stack([heads, tails], axis=1)
+        paths = paths[paths[:, 1] > paths[:, 0]]
+        for length in range(2, max_length + 1):
+            closed = has_edge(paths[:, -1], paths[:, 0])
+            cycles.extend(paths[closed].tolist())
+            if len(cycles) >= max_cycles or length == max_length or len(paths) == 0:
+                break
+            # Extend every path by each successor of its last node
+            lo, hi = offsets[paths[:, -1]], offsets[paths[:, -1] + 1]
+            degree = hi - lo
+            rows = np.repeat(np.arange(len(paths)), degree)
+            positions = np.arange(degree.sum()) - np.repeat(np.cumsum(degree) - degree, degree) + lo[rows]
+            paths = np.concatenate([paths[rows], tails[positions][:, None]], axis=1)
+            # Stay above the start node and never revisit a node
+            valid = paths[:, -1] > paths[:, 0]
+            for column in range(1, paths.shape[1] - 1):
+                valid &= paths[:, -1] != paths[:, column]
+            paths = paths[valid]
+        return cycles[:max_cycles]
+
+    def is_time_respecting_cycle(self, cycle):
+        """Check whether a cycle of account names can be traversed with non-decreasing steps."""
+        nodes = [self.account_id(name) for name in cycle]
+        if any(node is None for node in nodes):
+            return False
+        return self.is_time_respecting_node_cycle(nodes)
+
+    def is_time_respecting_node_cycle(self, nodes):
+        """Same as `is_time_respecting_cycle` for a cycle given as internal node ids."""
+        nodes = list(nodes)
+        for shift in range(len(nodes)):
+            rotation = nodes[shift:] + nodes[:shift]
+            time = None
+            for u, v in zip(rotation, rotation[1:] + rotation[:1]):
+                edges = self._out_edges(u, time)
+                hits = edges[self.dst[edges] == v]
+                if len(hits) == 0:
+                    break
+                # Edges are in step order, so the first hit is the earliest one
+                time = int(self.step[hits[0]])
+            else:
+                return True
+        return False
+
+    def find_layering_chains(self, min_hops=3, window=24, max_chains=1000):
+        """Find chains of >= `min_hops` onward transfers completed within `window` steps.
+
+        Chains never revisit an account, so cycles are left to round-tripping.
+        Returns a list of transaction-id lists, one per chain, each in time order.
+        """
+        chains = []
+        # Only accounts that both receive and send can be intermediaries
+        has_out = np.diff(self.out_offsets) > 0
+        candidates = np.flatnonzero(has_out[self.dst])
+
+        for first in candidates.tolist():
+            if self.src[first] == self.dst[first]:
+                continue
+            deadline = int(self.step[first]) + window
+            stack = [([first], {int(self.src[first]), int(self.dst[first])})]
+            while stack:
+                path, visited = stack.pop()
+                last = path[-1]
+                if len(path) >= min_hops:
+                    chains.append([int(self.transaction_id[e]) for e in path])
+                    if len(chains) >= max_chains:
+                        return chains
+                    continue
+                for edge in self._out_edges(int(self.dst[last]), int(self.step[last]), deadline).tolist():
+                    other = int(self.dst[edge])
+                    if other not in visited:
+                        stack.append((path + [edge], visited | {other}))
+        return chains